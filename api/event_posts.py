@@ -1,9 +1,9 @@
 from http.server import BaseHTTPRequestHandler
 from pymongo import MongoClient
 import json
-from bson import json_util
 from urllib.parse import parse_qs, urlparse
 import os
+import sys
 from dotenv import load_dotenv
 
 # 获取当前文件的目录
@@ -13,6 +13,10 @@ root_dir = os.path.dirname(current_dir)
 # 加载根目录下的 .env 文件
 load_dotenv(os.path.join(root_dir, '.env'))
 
+# 与后端共用的序列化模块
+sys.path.insert(0, os.path.join(root_dir, 'backend'))
+import serialization
+
 # 数据库连接
 def connect_to_db():
     client = MongoClient(os.getenv('MONGO_URI'))
@@ -51,6 +55,7 @@ class handler(BaseHTTPRequestHandler):
             ]
 
             posts = list(collection.aggregate(pipeline))
+            body, headers = serialization.encode_response({"posts": posts}, self.headers.get('Accept-Encoding', ''))
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
@@ -58,9 +63,11 @@ class handler(BaseHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
             self.send_header('Access-Control-Allow-Headers', 'Content-Type')
             self.send_header('Cache-Control', 'no-store, must-revalidate')
+            for key, value in headers.items():
+                self.send_header(key, value)
             self.end_headers()
             
-            self.wfile.write(json_util.dumps({"posts": posts}).encode())
+            self.wfile.write(body)
 
         except Exception as e:
             self.send_response(500)
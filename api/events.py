@@ -1,8 +1,8 @@
 from http.server import BaseHTTPRequestHandler
 from pymongo import MongoClient
 import json
-from bson import json_util
 import os
+import sys
 from dotenv import load_dotenv
 
 # 获取当前文件的目录
@@ -12,6 +12,10 @@ root_dir = os.path.dirname(current_dir)
 # 加载根目录下的 .env 文件
 load_dotenv(os.path.join(root_dir, '.env'))
 
+# 与后端共用的序列化模块
+sys.path.insert(0, os.path.join(root_dir, 'backend'))
+import serialization
+
 # 数据库连接
 def connect_to_db():
     client = MongoClient(os.getenv('MONGO_URI'))
@@ -51,17 +55,20 @@ class handler(BaseHTTPRequestHandler):
             # 查询数据
             documents = list(collection.aggregate(pipeline, allowDiskUse=True))
 
+            response = {
+                "events": documents,
+                "total_events": len(documents)
+            }
+            body, headers = serialization.encode_response(response, self.headers.get('Accept-Encoding', ''))
+
             # 返回响应
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
+            for key, value in headers.items():
+                self.send_header(key, value)
             self.end_headers()
-
-            response = {
-                "events": documents,
-                "total_events": len(documents)
-            }
-            self.wfile.write(json_util.dumps(response).encode())
+            self.wfile.write(body)
 
         except Exception as e:
             # 异常处理
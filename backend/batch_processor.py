@@ -0,0 +1,342 @@
+import logging
+import sys
+import os
+import json
+import time
+import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from info_processor import InfoProcessor, SUMMARY_BATCH_INSTRUCTION, parse_summary_batch
+import metrics
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 已经结束、不需要再轮询的批次状态
+FINISHED_STATUSES = {"ingested", "failed", "expired", "cancelled"}
+
+
+class BatchProcessor:
+    """
+    离线批处理模式：把待处理文档写成JSONL批量请求文件，提交到兼容OpenAI Batch的接口，
+    轮询完成后把结果文件流式写回数据库。适合新增信息源、修改prompt后重跑等大规模回填。
+    每条请求的 custom_id 为 "<kind>:<文档_id>"，写回时按 custom_id 定位文档，
+    只更新仍标记为等待该批次的文档，因此中断后重复写回是安全的。
+    批次记录（batch_jobs）在创建批次之前写入，OpenAI 的批次ID记录在 batch_id 字段中。
+    """
+    KINDS = {
+        "summary": "/v1/chat/completions",
+        "embedding": "/v1/embeddings",
+    }
+    # 停留在 submitting 状态超过这个时间（秒）且找不到对应批次的记录视为提交失败
+    SUBMIT_TIMEOUT = 3600
+
+    def __init__(self, processor: InfoProcessor, config: dict):
+        """
+        Args:
+            processor: InfoProcessor实例，复用其OpenAI客户端和数据库连接
+            config: 配置字典，包含以下参数:
+                - BATCH_DIR: 存放批量请求文件的目录（相对于backend目录）
+                - BATCH_MAX_REQUESTS: 每个批量请求文件最多包含的请求数
+                - BATCH_POLL_INTERVAL: 等待批次完成时的轮询间隔（秒）
+        """
+        self.processor = processor
+        self.client = processor.client
+        self.collection = processor.collection
+        self.jobs = processor.db['batch_jobs']
+        self.batch_dir = os.path.join(current_dir, config.get('BATCH_DIR', 'batch'))
+        self.max_requests = config.get('BATCH_MAX_REQUESTS', 50000)
+        self.poll_interval = config.get('BATCH_POLL_INTERVAL', 60)
+        os.makedirs(self.batch_dir, exist_ok=True)
+
+    def _pending_query(self, kind: str) -> tuple:
+        """待处理文档的查询条件和需要的字段"""
+        if kind == "summary":
+            query = {"summary": {"$exists": False}, "response": {"$exists": False}, "org": {"$exists": False}, "archived": {"$ne": 1}}
+            projection = {"_id": 1, "text": 1}
+        else:
+            query = {
+                "$or": [
+                    {"summary_embedding": {"$exists": False}},
+                    {"summary_embedding_space": {"$nin": self.processor.embedding_spaces}}
+                ],
+                "summary": {"$exists": True},
+                "archived": {"$ne": 1}
+            }
+            projection = {"_id": 1, "summary": 1}
+        # 已经在某个批次里等待结果的文档不再重复提交
+        query[f"{kind}_batch_id"] = {"$exists": False}
+        return query, projection
+
+    def _build_request(self, kind: str, doc: dict) -> dict:
+        """构造一行批量请求"""
+        if kind == "summary":
+            body = {
+                "model": self.processor.chat_model,
+                "messages": [{"role": "user", "content": SUMMARY_BATCH_INSTRUCTION + f"[1]\n{doc['text']}"}],
+                "temperature": self.processor.temperature,
+                "response_format": {"type": "json_object"}
+            }
+        else:
+            body = {
+                "model": self.processor.embed_model,
+                "input": self.processor.process_text(doc["summary"])
+            }
+        return {
+            "custom_id": f"{kind}:{doc['_id']}",
+            "method": "POST",
+            "url": self.KINDS[kind],
+            "body": body
+        }
+
+    @metrics.stage("batch_submit")
+    def submit(self, kind: str) -> list:
+        """
+        把所有待处理文档写成批量请求文件并提交，返回新建批次记录的ID列表
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"不支持的批处理类型: {kind}")
+        if kind == "embedding" and not self.processor.embedding_provider.space.startswith("openai:"):
+            raise ValueError("只有 EMBED_PROVIDER 为 openai 时才能使用 embedding 批处理")
+
+        query, projection = self._pending_query(kind)
+        text_field = "text" if kind == "summary" else "summary"
+        cursor = self.collection.find(query, projection)
+
+        batch_ids = []
+        chunk = []
+        for doc in cursor:
+            if not doc.get(text_field):
+                continue
+            chunk.append(doc)
+            if len(chunk) >= self.max_requests:
+                batch_ids.append(self._submit_chunk(kind, chunk))
+                chunk = []
+        if chunk:
+            batch_ids.append(self._submit_chunk(kind, chunk))
+
+        logger.info(f"已提交 {len(batch_ids)} 个 {kind} 批次。")
+        return batch_ids
+
+    def _submit_chunk(self, kind: str, documents: list) -> str:
+        """
+        写出一个JSONL文件，先登记批次记录并把文档标记为等待中，再上传文件、创建批次
+        创建批次前进程崩溃时，记录停留在 submitting 状态，由 poll 找回已创建的批次或解除文档标记
+        返回批次记录的ID
+        """
+        job_id = f"{kind}-{datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}"
+        path = os.path.join(self.batch_dir, f"{job_id}.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            for doc in documents:
+                f.write(json.dumps(self._build_request(kind, doc), ensure_ascii=False) + "\n")
+
+        job = {
+            "_id": job_id,
+            "kind": kind,
+            # 结果可能在配置更改之后才写回，记录提交时的模型和向量空间
+            "model": self.processor.chat_model if kind == "summary" else self.processor.embed_model,
+            "space": self.processor.embedding_provider.space if kind == "embedding" else None,
+            "status": "submitting",
+            "request_count": len(documents),
+            "ingested_lines": 0,
+            "created_at": datetime.datetime.utcnow().isoformat()
+        }
+        self.jobs.insert_one(job)
+        self.collection.update_many(
+            {"_id": {"$in": [doc["_id"] for doc in documents]}},
+            {"$set": {f"{kind}_batch_id": job_id}}
+        )
+
+        try:
+            with open(path, 'rb') as f:
+                input_file = self.client.files.create(file=f, purpose="batch")
+        except Exception:
+            # 文件没有上传成功，不可能已经创建批次
+            self._release(job)
+            self.jobs.update_one({"_id": job_id}, {"$set": {"status": "failed"}})
+            raise
+        # 创建批次的请求出错时批次仍可能已经创建，记录保持 submitting，由 poll 处理
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.KINDS[kind],
+            completion_window="24h",
+            metadata={"kind": kind, "job_id": job_id}
+        )
+
+        self.jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"batch_id": batch.id, "status": batch.status, "input_file_id": input_file.id}}
+        )
+        metrics.STAGE_DOCUMENTS.inc(len(documents), stage=f"batch_{kind}", result="submitted")
+        logger.info(f"批次 {job_id}（{batch.id}）已提交: {len(documents)} 条 {kind} 请求, 文件 {path}")
+        return job_id
+
+    def _find_batch(self, job: dict):
+        """按 metadata 中的 job_id 查找提交过程中断的批次，只检查登记之后创建的批次"""
+        created_at = datetime.datetime.fromisoformat(job["created_at"]).replace(tzinfo=datetime.timezone.utc).timestamp()
+        for batch in self.client.batches.list(limit=100):
+            if batch.created_at < created_at - 60:
+                break
+            if (batch.metadata or {}).get("job_id") == job["_id"]:
+                return batch
+        return None
+
+    def _release(self, job: dict) -> int:
+        """解除仍在等待该批次的文档的标记，下次提交时重新处理，返回解除的文档数"""
+        released = self.collection.update_many(
+            {f"{job['kind']}_batch_id": job["_id"]},
+            {"$unset": {f"{job['kind']}_batch_id": ""}}
+        )
+        if released.modified_count:
+            metrics.STAGE_DOCUMENTS.inc(released.modified_count, stage=f"batch_{job['kind']}", result="failed")
+            logger.warning(f"批次 {job['_id']} 中有 {released.modified_count} 篇文档没有结果，已解除标记。")
+        return released.modified_count
+
+    @metrics.stage("batch_poll")
+    def poll(self, wait: bool = False) -> dict:
+        """
+        检查所有未结束批次的状态，已完成的写回数据库
+        wait=True 时一直轮询到所有批次结束
+        返回 {批次ID: 状态}
+        """
+        while True:
+            statuses = {}
+            for job in self.jobs.find({"status": {"$nin": list(FINISHED_STATUSES)}}):
+                statuses[job["_id"]] = self._poll_job(job)
+
+            unfinished = [batch_id for batch_id, status in statuses.items() if status not in FINISHED_STATUSES]
+            if not wait or not unfinished:
+                return statuses
+            logger.info(f"还有 {len(unfinished)} 个批次未完成，{self.poll_interval} 秒后重新检查。")
+            time.sleep(self.poll_interval)
+
+    def _poll_job(self, job: dict) -> str:
+        if job["status"] == "submitting":
+            batch = self._find_batch(job)
+            if batch is None:
+                created_at = datetime.datetime.fromisoformat(job["created_at"])
+                if datetime.datetime.utcnow() - created_at < datetime.timedelta(seconds=self.SUBMIT_TIMEOUT):
+                    # 可能仍在提交中
+                    return "submitting"
+                self._release(job)
+                self.jobs.update_one({"_id": job["_id"]}, {"$set": {"status": "failed"}})
+                logger.warning(f"批次 {job['_id']} 提交时中断，没有找到已创建的批次。")
+                return "failed"
+            job["batch_id"] = batch.id
+            self.jobs.update_one({"_id": job["_id"]}, {"$set": {"batch_id": batch.id, "input_file_id": batch.input_file_id}})
+            logger.info(f"找回了提交时中断的批次 {job['_id']}（{batch.id}）")
+
+        batch = self.client.batches.retrieve(job["batch_id"])
+        if batch.status not in ("completed", "failed", "expired", "cancelled"):
+            self.jobs.update_one({"_id": job["_id"]}, {"$set": {"status": batch.status}})
+            return batch.status
+
+        # 过期或取消的批次也可能带有部分结果
+        if batch.output_file_id:
+            self._ingest(job, batch.output_file_id)
+        if batch.error_file_id:
+            self._log_errors(job, batch.error_file_id)
+
+        # 没有拿到结果的文档解除标记，下次提交时重新处理
+        self._release(job)
+
+        status = "ingested" if batch.status == "completed" else batch.status
+        self.jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": status, "output_file_id": batch.output_file_id, "error_file_id": batch.error_file_id}}
+        )
+        logger.info(f"批次 {job['_id']} 已结束，状态: {batch.status}")
+        return status
+
+    def _parse_result(self, job: dict, body: dict):
+        """从单条结果中取出要写入的字段，解析失败返回 None"""
+        if job["kind"] == "summary":
+            content = body["choices"][0]["message"]["content"]
+            parsed = parse_summary_batch(content, {"1"})
+            if "1" not in parsed:
+                return None
+            summary, response, org = parsed["1"]
+            return {"summary": summary, "response": response, "org": org}
+        embedding = body["data"][0]["embedding"]
+        return self.processor.embedding_fields(embedding, job["space"]) if embedding else None
+
+    def _ingest(self, job: dict, file_id: str, chunk_size: int = 1000) -> None:
+        """
+        流式读取结果文件，按 chunk_size 批量写回
+        已写回的行数记录在 batch_jobs 中，中断后从断点继续
+        """
+        kind = job["kind"]
+        skip = job.get("ingested_lines", 0)
+        model = job["model"]
+
+        operations = []
+        line_count = 0
+        with self.client.files.with_streaming_response.content(file_id) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                line_count += 1
+                if line_count <= skip:
+                    continue
+
+                result = json.loads(line)
+                prefix, _, doc_id = result["custom_id"].partition(":")
+                if prefix != kind:
+                    continue
+                body = (result.get("response") or {}).get("body") or {}
+                usage = body.get("usage") or {}
+                metrics.OPENAI_TOKENS.inc(usage.get("prompt_tokens", 0), model=model, type="batch_prompt")
+                metrics.OPENAI_TOKENS.inc(usage.get("completion_tokens", 0), model=model, type="batch_completion")
+                try:
+                    fields = self._parse_result(job, body) if result["response"]["status_code"] == 200 else None
+                except (KeyError, IndexError, TypeError):
+                    fields = None
+                if fields is None:
+                    continue
+
+                # 只更新仍在等待本批次结果的文档；摘要已经由其他途径生成的不再覆盖
+                query = {"_id": ObjectId(doc_id), f"{kind}_batch_id": job["_id"]}
+                if kind == "summary":
+                    query["summary"] = {"$exists": False}
+                operations.append(UpdateOne(
+                    query,
+                    {"$set": fields, "$unset": {f"{kind}_batch_id": ""}}
+                ))
+                if len(operations) >= chunk_size:
+                    self._flush(job, operations, line_count)
+                    operations = []
+
+        self._flush(job, operations, line_count)
+
+    def _flush(self, job: dict, operations: list, line_count: int) -> None:
+        if operations:
+            result = self.collection.bulk_write(operations, ordered=False)
+            metrics.STAGE_DOCUMENTS.inc(result.modified_count, stage=f"batch_{job['kind']}", result="updated")
+        self.jobs.update_one({"_id": job["_id"]}, {"$set": {"ingested_lines": line_count}})
+        job["ingested_lines"] = line_count
+
+    def _log_errors(self, job: dict, file_id: str) -> None:
+        with self.client.files.with_streaming_response.content(file_id) as response:
+            for line in response.iter_lines():
+                if line:
+                    logger.error(f"批次 {job['_id']} 请求出错: {line}")
+
+
+if __name__ == "__main__":
+    # 用法: python backend/batch_processor.py submit summary|embedding
+    #       python backend/batch_processor.py poll [--wait]
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    with open(os.path.join(current_dir, "config.json"), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    batch_processor = BatchProcessor(InfoProcessor(config), config)
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "submit":
+        batch_processor.submit(sys.argv[2])
+    elif len(sys.argv) >= 2 and sys.argv[1] == "poll":
+        print(batch_processor.poll(wait="--wait" in sys.argv))
+    else:
+        print("用法: batch_processor.py submit summary|embedding | poll [--wait]")
@@ -0,0 +1,93 @@
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider(ABC):
+    """
+    embedding后端的统一接口
+    space 标识向量空间（后端+模型），不同空间的向量不能放在一起聚类
+    chunk_size 为调用方每次传给 embed 的文本数
+    """
+    space = ""
+    chunk_size = 64
+
+    @abstractmethod
+    def embed(self, texts: list) -> list:
+        """返回与 texts 一一对应的向量列表"""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """调用OpenAI embeddings接口，一次请求传入一批文本"""
+
+    def __init__(self, call_openai, model: str, batch_size: int = 64):
+        """
+        Args:
+            call_openai: InfoProcessor._call_openai，负责重试和指标
+            model: embedding模型名称
+            batch_size: 每个请求的文本数
+        """
+        self.call_openai = call_openai
+        self.model = model
+        self.chunk_size = batch_size
+        self.space = f"openai:{model}"
+
+    def embed(self, texts: list) -> list:
+        response = self.call_openai("embeddings", self.model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    在本地CPU上运行 sentence-transformers 模型
+    文本按 batch_size 分批，由线程池并行编码（推理时会释放GIL）
+    每次 embed 接收 batch_size * threads 条文本，保证每个线程都有一批可编码
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 64, threads: int = 4):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("使用本地embedding需要先安装 sentence-transformers: pip install sentence-transformers") from e
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.chunk_size = batch_size * threads
+        self.space = f"local:{model_name}"
+        logger.info(f"本地embedding模型 {model_name} 加载完成")
+
+    def _encode(self, texts: list) -> list:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        ).tolist()
+
+    def embed(self, texts: list) -> list:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        embeddings = []
+        for batch_embeddings in self.executor.map(self._encode, batches):
+            embeddings.extend(batch_embeddings)
+        return embeddings
+
+
+def create_embedding_provider(config: dict, call_openai) -> EmbeddingProvider:
+    """
+    根据 config.json 中的 EMBED_PROVIDER 创建embedding后端
+        - openai: 使用 EMBED_MODEL，每个请求 EMBED_BATCH_SIZE 条文本
+        - local: 使用 LOCAL_EMBED_MODEL，线程数为 LOCAL_EMBED_THREADS，每个线程每批 EMBED_BATCH_SIZE 条文本
+    """
+    provider = config.get('EMBED_PROVIDER', 'openai')
+    if provider == 'openai':
+        return OpenAIEmbeddingProvider(call_openai, config['EMBED_MODEL'], batch_size=config.get('EMBED_BATCH_SIZE', 64))
+    if provider == 'local':
+        return LocalEmbeddingProvider(
+            config.get('LOCAL_EMBED_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2'),
+            batch_size=config.get('EMBED_BATCH_SIZE', 64),
+            threads=config.get('LOCAL_EMBED_THREADS', 4)
+        )
+    raise ValueError(f"不支持的embedding后端: {provider}")
@@ -4,11 +4,17 @@ import hdbscan
 import sys
 import datetime
 import os
+import json
+import time
 import numpy as np
 from dotenv import load_dotenv
 from tqdm import tqdm
-from pymongo import MongoClient
-from openai import OpenAI
+from pymongo import MongoClient, UpdateOne
+from openai import OpenAI, APIConnectionError, RateLimitError, InternalServerError
+import metrics
+from embedding_provider import create_embedding_provider
+from rollups import ActivityRollups
+from search_index import SearchIndex
 
 # 获取当前文件的目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -18,11 +24,61 @@ root_dir = os.path.dirname(current_dir)
 load_dotenv(os.path.join(root_dir, '.env'))
 
 logger = logging.getLogger(__name__)
+
+# 批量摘要的指令，只在每个请求开头出现一次
+SUMMARY_BATCH_INSTRUCTION = (
+    "下面是若干条带编号的文本。请对每一条文本分别完成：\n"
+    "1. 输出15个字以内的摘要，包含你认为最关键的信息；\n"
+    "2. 判断这段文本里是否包含中国国家机构对这一新闻事件的回应，如果包含的话为1，不包含的话为0；\n"
+    "3. 如果包含中国国家机构回应，给出国家机构名称（如果找不到，则为空字符串）。\n\n"
+    "请只返回一个JSON对象，格式如下，每条文本对应results中的一个元素，id为文本的编号：\n"
+    '{"results": [{"id": "1", "summary": "摘要内容", "response": 0, "org": "机构名称"}]}\n\n'
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算token数：中文大约一个字一个token（UTF-8下3字节），英文大约3-4个字符一个token
+    """
+    return len(text.encode('utf-8')) // 3 + 1
+
+
+def parse_summary_batch(content: str, expected_ids: set) -> dict:
+    """
+    解析并校验批量摘要返回的JSON，返回 {编号: (摘要, 回应, 机构)}
+    不合法的元素、未请求的编号都会被丢弃，由调用方重新提交缺失的部分
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return {}
+    items = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return {}
+
+    parsed = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        item_id = str(item.get("id", "")).strip()
+        summary = item.get("summary")
+        response = item.get("response", 0)
+        org = item.get("org") or ""
+        if item_id not in expected_ids or not isinstance(summary, str) or not summary.strip():
+            continue
+        if isinstance(response, str) and response.strip() in ("0", "1"):
+            response = int(response.strip())
+        if response not in (0, 1) or not isinstance(org, str):
+            continue
+        parsed[item_id] = (summary.strip(), int(response), org.strip())
+    return parsed
+
  
 class InfoProcessor:
     """
     从数据库取数据、调用OpenAI API获得结果，然后写回数据库
-    包括预处理（process_text）、摘要（summary）、聚类（do_hdbscan）、生成事件标题（generate_cluster_titles）
+    包括预处理（process_text）、摘要（summary）、聚类（do_hdbscan）、生成事件标题（generate_cluster_titles）、
+    全文检索索引（index_search）
     """
     def __init__(self, config: dict):
         """
@@ -33,29 +89,55 @@ class InfoProcessor:
                 - API_KEY: OpenAI API密钥
                 - CHAT_MODEL: 使用的GPT聊天模型名称
                 - EMBED_MODEL: 使用的文本嵌入模型名称
+                - EMBED_PROVIDER: embedding后端，openai 或 local（本地CPU上的sentence-transformers模型）
+                - EMBED_BATCH_SIZE: 每个embedding请求（本地后端为每个线程的每一批）的文本条数
+                - LOCAL_EMBED_MODEL: 本地embedding模型名称
+                - LOCAL_EMBED_THREADS: 本地embedding的线程数
                 - TEMPERATURE: GPT生成结果的随机性参数(0-1)
                 - MIN_CLUSTER_SIZE: HDBSCAN聚类的最小簇大小
                 - MIN_SAMPLES: HDBSCAN聚类的最小样本数
                 - EPSILON: HDBSCAN聚类的邻域大小参数
                 - DELETE_OLD_DAYS: 删除多少天前的旧数据
                 - ARCHIVE_OLD_DAYS: 归档多少天前的旧数据
+                - OPENAI_MAX_RETRIES: OpenAI请求失败（网络、限流、服务端错误）时的最大重试次数
+                - SUMMARY_BATCH_TOKENS: 批量摘要时每个请求中文本部分的token预算
+                - SUMMARY_BATCH_MAX_POSTS: 批量摘要时每个请求最多包含的文本条数
+                - SUMMARY_BATCH_ROUNDS: 批量摘要时失败或缺失的文本最多提交几轮
         """
         # 初始化数据库连接
         try:
-            self.mongo_client = MongoClient(os.getenv('MONGO_URI'))
+            self.mongo_client = MongoClient(
+                os.getenv('MONGO_URI'),
+                event_listeners=[metrics.MongoCommandListener()]
+            )
             self.db = self.mongo_client['weibo']
             self.collection = self.db['weibo']
+            self.rollups = ActivityRollups(self.db)
+            self.search_index = SearchIndex(self.db)
+            self.search_index.ensure_indexes()
+            # 聚类结果的版本，实时处理进程据此判断事件中心是否过期
+            self.cluster_state = self.db['cluster_state']
             logger.info('MongoDB连接成功')
         except Exception as e:
             logger.error(f'MongoDB连接失败: {e}')
             raise e
 
         # 初始化OpenAI客户端
-        self.client = OpenAI(api_key=os.getenv('API_KEY'))
+        # 重试由 _call_openai 自己负责，以便统计重试次数
+        self.client = OpenAI(api_key=os.getenv('API_KEY'), max_retries=0)
+        self.max_retries = config.get('OPENAI_MAX_RETRIES', 2)
         self.chat_model = config['CHAT_MODEL']
         self.embed_model = config['EMBED_MODEL']
         self.temperature = config['TEMPERATURE']
 
+        # embedding后端，向量所属空间记录在每篇文档的 summary_embedding_space 中
+        self.embedding_provider = create_embedding_provider(config, self._call_openai)
+        # 引入该字段之前的文档都是用 OpenAI EMBED_MODEL 生成的，视为同一空间
+        legacy_space = f"openai:{self.embed_model}"
+        self.embedding_spaces = [self.embedding_provider.space]
+        if self.embedding_provider.space == legacy_space:
+            self.embedding_spaces.append(None)
+
         # 聚类配置
         self.cluster_config = {
             'min_cluster_size': config['MIN_CLUSTER_SIZE'],
@@ -65,12 +147,62 @@ class InfoProcessor:
         self.delete_old_days = config['DELETE_OLD_DAYS']
         self.archive_old_days = config['ARCHIVE_OLD_DAYS']
 
+        # 批量摘要配置
+        self.summary_batch_tokens = config.get('SUMMARY_BATCH_TOKENS', 3000)
+        self.summary_batch_max_posts = config.get('SUMMARY_BATCH_MAX_POSTS', 20)
+        self.summary_batch_rounds = config.get('SUMMARY_BATCH_ROUNDS', 3)
+
+
+    def _call_openai(self, endpoint: str, model: str, **kwargs):
+        """
+        调用OpenAI接口，遇到网络、限流和服务端错误时按指数退避重试
+        同时记录请求耗时、token用量、重试和错误次数
+        """
+        create = self.client.chat.completions.create if endpoint == "chat" else self.client.embeddings.create
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                response = create(model=model, **kwargs)
+            except (APIConnectionError, RateLimitError, InternalServerError) as e:
+                metrics.OPENAI_ERRORS.inc(model=model, error=type(e).__name__)
+                if attempt == self.max_retries:
+                    raise
+                metrics.OPENAI_RETRIES.inc(model=model)
+                time.sleep(min(0.5 * 2 ** attempt, 8))
+                continue
+            except Exception as e:
+                metrics.OPENAI_ERRORS.inc(model=model, error=type(e).__name__)
+                raise
+            finally:
+                metrics.OPENAI_SECONDS.observe(time.perf_counter() - start, model=model, endpoint=endpoint)
+
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                metrics.OPENAI_TOKENS.inc(usage.prompt_tokens or 0, model=model, type="prompt")
+                metrics.OPENAI_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, type="completion")
+            return response
+
+
+    def mark_clusters_changed(self, in_progress: bool = None) -> None:
+        """
+        聚类编号或标题变化时更新 cluster_state 中的版本号
+        in_progress 为 True 表示聚类编号已改写、标题尚未生成，此时实时处理进程暂停归类，
+        同时记录开始时间 started_at，实时处理进程据此忽略长时间没有结束的聚类
+        """
+        fields = {"generation": time.time()}
+        if in_progress is not None:
+            fields["in_progress"] = in_progress
+        if in_progress:
+            fields["started_at"] = fields["generation"]
+        self.cluster_state.update_one({"_id": "clusters"}, {"$set": fields}, upsert=True)
+
 
     def generate_summary_response(self, user_prompt: str) -> str:
         """生成摘要和回应信息"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.chat_model,
+            response = self._call_openai(
+                "chat",
+                self.chat_model,
                 messages=[{"role": "user", "content": user_prompt}],
                 temperature=self.temperature
             )
@@ -83,15 +215,12 @@ class InfoProcessor:
     def generate_embedding(self, input_text: str) -> list:
         """生成文本的embedding向量"""
         try:
-            response = self.client.embeddings.create(
-                input=input_text,
-                model=self.embed_model
-            )
-            return response.data[0].embedding
+            return self.embedding_provider.embed([input_text])[0]
         except Exception as e:
             logger.error(f"调用 Embedding 出错: {e}")
             return []
 
+    @metrics.stage("delete_old")
     def delete_old(self):
         """
         删除指定天数前的、且聚类结果为 -1（噪声点）的数据
@@ -104,6 +233,7 @@ class InfoProcessor:
         }
 
         result = self.collection.delete_many(query)
+        metrics.STAGE_DOCUMENTS.inc(result.deleted_count, stage="delete_old", result="deleted")
         logger.info(f"已删除 {result.deleted_count} 条符合条件的数据。")
 
     def process_text(self, text: str) -> str:
@@ -113,12 +243,15 @@ class InfoProcessor:
         return text.strip()
 
 
+    @metrics.stage("summary")
     def summary(self) -> None:
         """
         为所有文档生成15个字以内的摘要，判断是否包含政府回应以及机构。
         """
+        # 已经在离线批次里等待结果的文档（带 summary_batch_id）由批处理写回，这里跳过
         documents = list(self.collection.find(
-            {"summary": {"$exists": False}, "response": {"$exists": False}, "org": {"$exists": False}, "archived": {"$ne": 1}}, 
+            {"summary": {"$exists": False}, "response": {"$exists": False}, "org": {"$exists": False}, "archived": {"$ne": 1},
+             "summary_batch_id": {"$exists": False}}, 
             {"_id": 1, "text": 1}
         ))
         updated_count = 0
@@ -149,6 +282,7 @@ class InfoProcessor:
                     org_name = lines[2].split('：')[1].strip() if len(lines) > 2 else ""
                 except Exception as e:
                     logger.error(f"解析返回结果失败: {e}, 原始返回: {summary_text}")
+                    metrics.STAGE_DOCUMENTS.inc(stage="summary", result="parse_failed")
                     continue
 
                 try:
@@ -161,52 +295,209 @@ class InfoProcessor:
                         }}
                     )
                     updated_count += 1
+                    metrics.STAGE_DOCUMENTS.inc(stage="summary", result="updated")
                 except Exception as e:
                     logger.error(f"数据库更新失败: {e}, 文档ID: {doc['_id']}")
+                    metrics.STAGE_DOCUMENTS.inc(stage="summary", result="failed")
                     continue
+            else:
+                metrics.STAGE_DOCUMENTS.inc(stage="summary", result="failed")
 
         logger.info(f"共处理并更新了 {updated_count} 篇文档的摘要和政府回应。")
 
 
-    def summary_embedding(self):
+    def pack_summary_batches(self, documents: list) -> list:
         """
-        对 summary 字段做Embedding
+        按token预算把文档装进若干批次，每批不超过 summary_batch_max_posts 条
+        单条超过预算的文本单独成批
+        """
+        batches = []
+        current, current_tokens = [], 0
+        for doc in documents:
+            tokens = estimate_tokens(doc["text"])
+            if current and (current_tokens + tokens > self.summary_batch_tokens
+                            or len(current) >= self.summary_batch_max_posts):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(doc)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+
+    def generate_summary_batch(self, documents: list) -> dict:
+        """
+        把一批文档放进同一个请求，要求以JSON返回
+        返回 {文档_id: (摘要, 回应, 机构)}，只包含通过校验的文档
+        """
+        # 用批内序号而不是 ObjectId 作为编号，节省token
+        id_map = {str(i): doc["_id"] for i, doc in enumerate(documents, start=1)}
+        posts = "\n\n".join(f"[{i}]\n{doc['text']}" for i, doc in enumerate(documents, start=1))
+        try:
+            response = self._call_openai(
+                "chat",
+                self.chat_model,
+                messages=[{"role": "user", "content": SUMMARY_BATCH_INSTRUCTION + posts}],
+                temperature=self.temperature,
+                response_format={"type": "json_object"}
+            )
+            content = response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"调用 GPT Chat 出错: {e}")
+            return {}
+
+        parsed = parse_summary_batch(content, set(id_map))
+        return {id_map[item_id]: result for item_id, result in parsed.items()}
+
+
+    def summarize_documents(self, documents: list) -> int:
+        """
+        批量生成摘要并写回数据库，返回成功更新的文档数
+        每一轮只重新提交上一轮失败或缺失的文档，最多 summary_batch_rounds 轮
+        """
+        pending = [doc for doc in documents if doc.get("text")]
+        updated_count = 0
+
+        for round_index in range(self.summary_batch_rounds):
+            if not pending:
+                break
+            batches = self.pack_summary_batches(pending)
+            failed = []
+            for batch in tqdm(batches, desc=f"正在批量生成摘要（第{round_index + 1}轮）", file=sys.stdout):
+                results = self.generate_summary_batch(batch)
+                operations = [
+                    UpdateOne(
+                        {"_id": doc_id},
+                        {"$set": {"summary": summary, "response": response, "org": org}}
+                    )
+                    for doc_id, (summary, response, org) in results.items()
+                ]
+                if operations:
+                    try:
+                        self.collection.bulk_write(operations, ordered=False)
+                        updated_count += len(operations)
+                        metrics.STAGE_DOCUMENTS.inc(len(operations), stage="summary_batch", result="updated")
+                    except Exception as e:
+                        # 写入失败的整批文档与解析失败的一样，下一轮重新提交
+                        logger.error(f"数据库批量更新失败: {e}")
+                        results = {}
+                failed.extend(doc for doc in batch if doc["_id"] not in results)
+
+            if failed:
+                logger.warning(f"第{round_index + 1}轮有 {len(failed)} 篇文档解析失败或缺失，重新提交。")
+                metrics.STAGE_DOCUMENTS.inc(len(failed), stage="summary_batch", result="retried")
+            pending = failed
+
+        if pending:
+            logger.error(f"{len(pending)} 篇文档在 {self.summary_batch_rounds} 轮后仍未生成摘要，留待下次处理。")
+            metrics.STAGE_DOCUMENTS.inc(len(pending), stage="summary_batch", result="failed")
+        return updated_count
+
+
+    @metrics.stage("summary_batch")
+    def summary_batch(self) -> None:
+        """
+        批量模式的 summary：按token预算把多篇文档打包进一个请求，以JSON返回并校验
         """
         documents = list(self.collection.find(
-            {"summary_embedding": {"$exists": False}, "archived": {"$ne": 1}}, 
-            {"_id": 1, "summary": 1}
+            {"summary": {"$exists": False}, "response": {"$exists": False}, "org": {"$exists": False}, "archived": {"$ne": 1},
+             "summary_batch_id": {"$exists": False}},
+            {"_id": 1, "text": 1}
         ))
+        updated_count = self.summarize_documents(documents)
+        logger.info(f"共批量处理并更新了 {updated_count} 篇文档的摘要和政府回应。")
+
+
+    def embedding_fields(self, embedding: list, space: str = None) -> dict:
+        """
+        写入文档的embedding字段，同时记录向量空间和维度
+        space 默认为当前后端的向量空间，离线批次写回时传入提交时的空间
+        """
+        return {
+            "summary_embedding": embedding,
+            "summary_embedding_space": space or self.embedding_provider.space,
+            "summary_embedding_dim": len(embedding)
+        }
+
 
+    def embed_documents(self, documents: list) -> int:
+        """
+        按后端的 chunk_size 分批生成embedding并写回数据库，返回成功更新的文档数
+        """
+        documents = [doc for doc in documents if doc.get("summary")]
+        chunk_size = self.embedding_provider.chunk_size
         processed_count = 0
-        for doc in tqdm(documents, desc="正在生成embedding", file=sys.stdout):
-            raw_text = doc.get("summary", "")
-            if not raw_text:
+        for start in tqdm(range(0, len(documents), chunk_size), desc="正在生成embedding", file=sys.stdout):
+            batch = documents[start:start + chunk_size]
+            try:
+                embeddings = self.embedding_provider.embed([self.process_text(doc["summary"]) for doc in batch])
+            except Exception as e:
+                logger.error(f"调用 Embedding 出错: {e}")
+                metrics.STAGE_DOCUMENTS.inc(len(batch), stage="summary_embedding", result="failed")
                 continue
 
-            processed_text = self.process_text(raw_text)
-            embedding = self.generate_embedding(processed_text)
-            if embedding:
-                self.collection.update_one(
-                    {"_id": doc["_id"]},
-                    {"$set": {"summary_embedding": embedding}}
-                )
-                processed_count += 1
+            operations = [
+                UpdateOne({"_id": doc["_id"]}, {"$set": self.embedding_fields(embedding)})
+                for doc, embedding in zip(batch, embeddings) if embedding
+            ]
+            if operations:
+                try:
+                    self.collection.bulk_write(operations, ordered=False)
+                except Exception as e:
+                    logger.error(f"数据库批量更新失败: {e}")
+                    metrics.STAGE_DOCUMENTS.inc(len(batch), stage="summary_embedding", result="failed")
+                    continue
+                processed_count += len(operations)
+                metrics.STAGE_DOCUMENTS.inc(len(operations), stage="summary_embedding", result="updated")
+        return processed_count
 
-        logger.info(f"新处理了 {processed_count} 个文档的摘要GPT句向量！")
+
+    @metrics.stage("summary_embedding")
+    def summary_embedding(self):
+        """
+        对 summary 字段做Embedding
+        没有embedding、或者embedding不属于当前后端向量空间的文档都会被（重新）处理
+        """
+        documents = list(self.collection.find(
+            {
+                "$or": [
+                    {"summary_embedding": {"$exists": False}},
+                    {"summary_embedding_space": {"$nin": self.embedding_spaces}}
+                ],
+                "archived": {"$ne": 1},
+                # 已经在离线批次里等待结果的文档由批处理写回
+                "embedding_batch_id": {"$exists": False}
+            },
+            {"_id": 1, "summary": 1}
+        ))
+
+        processed_count = self.embed_documents(documents)
+        logger.info(f"新处理了 {processed_count} 个文档的摘要句向量（{self.embedding_provider.space}）！")
 
 
+    @metrics.stage("do_hdbscan")
     def do_hdbscan(self):
         """
         使用HDBSCAN进行聚类，并更新文档的 summary_embedding_cluster_label 字段
+        只使用当前embedding后端向量空间中的文档，避免混用不同空间的向量
         """
         documents = list(self.collection.find({
-            "summary_embedding": {"$exists": True}
+            "summary_embedding": {"$exists": True},
+            "summary_embedding_space": {"$in": self.embedding_spaces}
             # "archived": {"$ne": 1}
         }))
         if not documents:
             logger.warning("没有任何文档包含 summary_embedding，无法聚类。")
             return
 
+        # 同一空间内维度应当一致，以防万一只保留最常见的维度
+        dims = [len(doc["summary_embedding"]) for doc in documents]
+        dim = max(set(dims), key=dims.count)
+        if len(set(dims)) > 1:
+            logger.warning(f"发现 {len(dims) - dims.count(dim)} 篇文档的embedding维度不是 {dim}，已跳过。")
+            documents = [doc for doc in documents if len(doc["summary_embedding"]) == dim]
+
         X = np.array([doc["summary_embedding"] for doc in documents], dtype=np.float32)
         logger.info(f"正在对字段 'summary_embedding' 做 HDBSCAN 聚类: X shape = {X.shape}")
 
@@ -215,8 +506,12 @@ class InfoProcessor:
             min_samples=self.cluster_config['min_samples'],
             # cluster_selection_epsilon=self.cluster_config['epsilon'],
         )
-        cluster_labels = self.clusterer.fit_predict(X)
-        
+        with metrics.span("do_hdbscan.fit"):
+            cluster_labels = self.clusterer.fit_predict(X)
+        metrics.STAGE_DOCUMENTS.inc(len(documents), stage="do_hdbscan", result="clustered")
+
+        # 重新编号后、生成标题前，编号与旧标题对应不上
+        self.mark_clusters_changed(in_progress=True)
         for doc, label in zip(documents, cluster_labels):
             self.collection.update_one(
                 {"_id": doc["_id"]},
@@ -227,10 +522,23 @@ class InfoProcessor:
         logger.info(f"字段 'summary_embedding' 聚类完成，共识别出 {n_clusters} 个簇。")
 
 
+    @metrics.stage("generate_cluster_titles")
     def generate_cluster_titles(self):
+        """
+        生成事件标题并重建汇总，无论成功、出错还是尚未聚类，结束时都清除“聚类进行中”状态，
+        避免实时处理进程一直暂停归类
+        """
+        try:
+            self._generate_cluster_titles()
+        finally:
+            self.mark_clusters_changed(in_progress=False)
+
+
+    def _generate_cluster_titles(self):
         """
         为满足最小簇大小要求的簇生成标题。
         使用 summary_embedding_cluster_label 作为唯一标识，不再生成 event_id。
+        完成后重建事件活跃度汇总（event_activity）。
         """
         # 确保我们已经有 self.clusterer（即已经做过 do_hdbscan）
         clusterer = getattr(self, 'clusterer', None)
@@ -297,18 +605,25 @@ class InfoProcessor:
                     "event_title": title
                 }}
             )
+            metrics.STAGE_DOCUMENTS.inc(update_result.modified_count, stage="generate_cluster_titles", result="updated")
             logger.info(
                 f"为簇号 {cluster_label} 生成标题：{title}，"
                 f"并更新了 {update_result.modified_count} 篇文档。"
             )
 
+        # 聚类编号和标题都已确定，重建事件活跃度汇总和事件标题索引
+        self.rollups.rebuild()
+        self.search_index.rebuild_titles()
+
 
+    @metrics.stage("archive_inactive_events")
     def archive_inactive_events(self):
         """
         将“长时间没有更新”的事件归档：
         1. 聚合获取每个 event_title 的“最新”一条微博时间
         2. 若最后一条微博时间早于设定天数(archive_old_days)前，则将该事件标记为 archived=1
         3. 同时将该事件的 summary_embedding_cluster_label 改为一个随机值（>999999），避免再被视为活跃事件
+        4. 事件活跃度汇总随之移到新的 cluster_label 下
         """
         # 1) 聚合获取每个 event_title 的最新微博时间
         last_events = list(self.collection.aggregate([
@@ -348,7 +663,7 @@ class InfoProcessor:
             if last_weibo_time < threshold_time:
                 # 更新该 event_title 的所有文档
                 new_label = int(unique_labels[i])
-                self.collection.update_many(
+                archive_result = self.collection.update_many(
                     {"event_title": event_title},
                     {
                         "$set": {
@@ -357,7 +672,36 @@ class InfoProcessor:
                         }
                     }
                 )
+                self.rollups.archive(event_title, new_label)
                 archived_count += 1
+                metrics.STAGE_DOCUMENTS.inc(archive_result.modified_count, stage="archive_inactive_events", result="archived")
                 logger.info(f"已归档事件: {event_title}, 最后一条微博时间: {last_weibo_time}, 新的 cluster_label = {new_label}")
 
+        if archived_count:
+            self.search_index.rebuild_titles()
+            self.mark_clusters_changed()
         logger.info(f"检查了 {event_count} 个事件，共归档了 {archived_count} 个事件。")
+
+
+    @metrics.stage("index_search")
+    def index_search(self, chunk_size: int = 5000):
+        """
+        为已生成摘要、尚未建立索引的帖子建立全文检索索引，然后合并倒排表分段
+        """
+        cursor = self.collection.find(
+            {"search_docno": {"$exists": False}, "summary": {"$exists": True}},
+            {"_id": 1, "text": 1, "summary": 1, "created_at": 1}
+        )
+
+        indexed_count = 0
+        chunk = []
+        for doc in cursor:
+            chunk.append(doc)
+            if len(chunk) >= chunk_size:
+                indexed_count += self.search_index.index_posts(chunk)
+                chunk = []
+        indexed_count += self.search_index.index_posts(chunk)
+        metrics.STAGE_DOCUMENTS.inc(indexed_count, stage="index_search", result="indexed")
+
+        self.search_index.compact()
+        logger.info(f"为 {indexed_count} 篇帖子建立了全文检索索引。")
@@ -4,9 +4,12 @@ import json
 import os
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from info_processor import InfoProcessor
+from batch_processor import BatchProcessor
+import metrics
 
 
 logging.basicConfig(
@@ -24,8 +27,11 @@ config_path = os.path.split(os.path.realpath(__file__))[0] + os.sep + "config.js
 with open(config_path, 'r', encoding='utf-8') as f:
     config = json.load(f)
 
+metrics.configure(trace_spans=config.get('TRACE_SPANS', False))
+
 # 创建服务实例
 info_processor = InfoProcessor(config)
+batch_processor = BatchProcessor(info_processor, config)
 
 class ProcessResponse(BaseModel):
     status: str
@@ -45,10 +51,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按路由统计请求耗时
+app.middleware("http")(metrics.http_middleware)
+
 @app.get("/")
 def root():
     return {"status": "ok", "message": "新闻信息系统API服务正在运行"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/api/process/delete_old")
 async def delete_old():
     try:
@@ -67,6 +80,15 @@ async def process_summary():
         logger.error(f"摘要生成错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/process/summary_batch")
+async def process_summary_batch():
+    try:
+        info_processor.summary_batch()
+        return ProcessResponse(status="success", message="批量摘要生成完成")
+    except Exception as e:
+        logger.error(f"批量摘要生成错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/process/embedding")
 async def process_embedding():
     try:
@@ -112,5 +134,43 @@ async def archive_inactive_events():
         logger.error(f"已归档事件错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/process/search_index")
+async def process_search_index():
+    try:
+        info_processor.index_search()
+        return ProcessResponse(status="success", message="全文检索索引更新完成")
+    except Exception as e:
+        logger.error(f"全文检索索引错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/process/rollups")
+async def rebuild_rollups():
+    try:
+        info_processor.rollups.rebuild()
+        return ProcessResponse(status="success", message="事件活跃度汇总重建完成")
+    except Exception as e:
+        logger.error(f"事件活跃度汇总重建错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/batch/submit/{kind}")
+async def batch_submit(kind: str):
+    if kind not in BatchProcessor.KINDS:
+        raise HTTPException(status_code=400, detail=f"不支持的批处理类型: {kind}")
+    try:
+        batch_ids = batch_processor.submit(kind)
+        return ProcessResponse(status="success", message=f"已提交 {len(batch_ids)} 个批次: {', '.join(batch_ids)}")
+    except Exception as e:
+        logger.error(f"批次提交错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/batch/poll")
+async def batch_poll():
+    try:
+        statuses = batch_processor.poll()
+        return ProcessResponse(status="success", message=json.dumps(statuses, ensure_ascii=False))
+    except Exception as e:
+        logger.error(f"批次轮询错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8888)
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+轻量级指标采集：计数器、直方图，以 Prometheus 文本格式输出到 /metrics
+每次记录只做一次字典查找和一次加锁累加，开销足够低，可以在生产环境常开
+可选的 span 日志会把每个阶段的耗时写进日志（TRACE_SPANS）
+"""
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 秒级耗时的默认分桶，覆盖 Mongo 查询（毫秒级）到 GPT 调用（十秒级）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各分桶计数(最后一个是+Inf), 总和, 总数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{self._format_labels(key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+_registry = []
+_trace_spans = False
+
+
+def counter(name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """以 Prometheus 文本格式输出所有指标"""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def configure(trace_spans: bool = False) -> None:
+    """是否把每个阶段（span）的耗时写入日志"""
+    global _trace_spans
+    _trace_spans = bool(trace_spans)
+
+
+# 流水线各阶段
+STAGE_SECONDS = histogram("csed_stage_duration_seconds", "InfoProcessor 各阶段耗时", ("stage",))
+STAGE_DOCUMENTS = counter("csed_stage_documents_total", "InfoProcessor 各阶段处理的文档数", ("stage", "result"))
+
+# OpenAI
+OPENAI_SECONDS = histogram("csed_openai_request_duration_seconds", "OpenAI 请求耗时", ("model", "endpoint"))
+OPENAI_TOKENS = counter("csed_openai_tokens_total", "OpenAI token 用量", ("model", "type"))
+OPENAI_RETRIES = counter("csed_openai_retries_total", "OpenAI 请求重试次数", ("model",))
+OPENAI_ERRORS = counter("csed_openai_errors_total", "OpenAI 请求错误次数", ("model", "error"))
+
+# MongoDB
+MONGO_SECONDS = histogram("csed_mongo_operation_duration_seconds", "MongoDB 命令耗时", ("command", "collection", "shape"))
+MONGO_ERRORS = counter("csed_mongo_errors_total", "MongoDB 命令失败次数", ("command", "collection"))
+
+# HTTP
+HTTP_SECONDS = histogram("csed_http_request_duration_seconds", "HTTP 请求耗时", ("method", "route", "status"))
+
+# 实时入库
+STREAM_LATENCY_SECONDS = histogram(
+    "csed_stream_visible_latency_seconds", "从帖子写入数据库到处理完成（归入事件）的延迟", ("result",),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+
+@contextmanager
+def span(name: str):
+    """记录一个阶段的耗时；开启 TRACE_SPANS 时同时写入日志"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if _trace_spans:
+            logger.info(f"[span] {name} 耗时 {elapsed * 1000:.1f} ms")
+
+
+def stage(name: str):
+    """装饰器：把整个方法作为一个 span 计时"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def http_middleware(request, call_next):
+    """FastAPI 中间件：按路由模板（而不是实际路径）统计请求耗时"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-type', CONTENT_TYPE)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int) -> None:
+    """给没有 FastAPI 的常驻进程（如 stream_worker）在后台线程里提供 /metrics"""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+# 只统计读写数据的命令，忽略心跳、握手等
+_TRACKED_COMMANDS = {
+    "find", "aggregate", "getMore", "insert", "update", "delete",
+    "count", "distinct", "findAndModify", "createIndexes"
+}
+
+
+def _query_shape(command_name: str, command) -> str:
+    """
+    提取查询的“形状”：过滤条件中出现的字段名（不含取值），聚合则是各阶段名称
+    例如 find {"summary": {"$exists": False}, "archived": {"$ne": 1}} -> "archived,summary"
+    """
+    query = None
+    if command_name in ("find", "count", "distinct", "findAndModify"):
+        query = command.get("filter") or command.get("query")
+    elif command_name == "update":
+        updates = command.get("updates") or [{}]
+        query = updates[0].get("q")
+    elif command_name == "delete":
+        deletes = command.get("deletes") or [{}]
+        query = deletes[0].get("q")
+    elif command_name == "aggregate":
+        stages = [next(iter(s), "") for s in command.get("pipeline", [])]
+        return "|".join(stages)
+    if not query:
+        return ""
+    return ",".join(sorted(query.keys()))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """挂到 MongoClient(event_listeners=[...]) 上，按命令、集合和查询形状统计耗时"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        if event.command_name not in _TRACKED_COMMANDS:
+            return
+        command = event.command
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        self._pending[(event.request_id, event.connection_id)] = (
+            str(collection or ""),
+            _query_shape(event.command_name, command)
+        )
+
+    def succeeded(self, event):
+        labels = self._pending.pop((event.request_id, event.connection_id), None)
+        if labels is None:
+            return
+        collection, shape = labels
+        MONGO_SECONDS.observe(
+            event.duration_micros / 1_000_000,
+            command=event.command_name,
+            collection=collection,
+            shape=shape
+        )
+
+    def failed(self, event):
+        labels = self._pending.pop((event.request_id, event.connection_id), None)
+        if labels is None:
+            return
+        MONGO_ERRORS.inc(command=event.command_name, collection=labels[0])
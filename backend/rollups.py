@@ -0,0 +1,135 @@
+import logging
+import time
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityRollups:
+    """
+    按“事件 + 天”预先汇总的活跃度，存放在 weibo.event_activity：
+        {label, day, event_title, archived, count, attitudes, comments, reposts, hours: {"00": n, ...}}
+    时间线的走势图、今日热门等都直接读这个集合，不需要每次对全部帖子做聚合
+
+    - 每次生成事件标题后按当前聚类结果重建活跃事件的汇总（聚类编号每次都会变化）
+    - 实时处理归入事件的新帖子以 $inc 增量累加
+    - 归档事件时把汇总改到新的编号下，不需要重新计算
+    """
+
+    def __init__(self, db):
+        self.posts = db['weibo']
+        self.collection = db['event_activity']
+        self.collection.create_index([("label", ASCENDING), ("day", ASCENDING)], unique=True)
+        self.collection.create_index([("day", ASCENDING), ("count", DESCENDING)])
+
+    def rebuild(self) -> None:
+        """
+        根据当前聚类结果重建所有未归档事件的汇总
+        先合并写入新结果，再删除本次没有写到的旧汇总，重建期间读接口不会读到空数据
+        """
+        stamp = time.time()
+        self.posts.aggregate([
+            {"$match": {
+                "summary_embedding_cluster_label": {"$exists": True, "$ne": -1},
+                "event_title": {"$exists": True},
+                "created_at": {"$type": "string"},
+                "archived": {"$ne": 1}
+            }},
+            {"$group": {
+                "_id": {
+                    "label": "$summary_embedding_cluster_label",
+                    "day": {"$substrBytes": ["$created_at", 0, 10]},
+                    "hour": {"$substrBytes": ["$created_at", 11, 2]}
+                },
+                "event_title": {"$first": "$event_title"},
+                "count": {"$sum": 1},
+                "attitudes": {"$sum": {"$ifNull": ["$attitudes_count", 0]}},
+                "comments": {"$sum": {"$ifNull": ["$comments_count", 0]}},
+                "reposts": {"$sum": {"$ifNull": ["$reposts_count", 0]}}
+            }},
+            {"$group": {
+                "_id": {"label": "$_id.label", "day": "$_id.day"},
+                "event_title": {"$first": "$event_title"},
+                "count": {"$sum": "$count"},
+                "attitudes": {"$sum": "$attitudes"},
+                "comments": {"$sum": "$comments"},
+                "reposts": {"$sum": "$reposts"},
+                "hours": {"$push": {"k": "$_id.hour", "v": "$count"}}
+            }},
+            {"$project": {
+                "_id": 0,
+                "label": "$_id.label",
+                "day": "$_id.day",
+                "event_title": 1,
+                "archived": {"$literal": 0},
+                "count": 1,
+                "attitudes": 1,
+                "comments": 1,
+                "reposts": 1,
+                "hours": {"$arrayToObject": "$hours"},
+                "rebuilt_at": {"$literal": stamp}
+            }},
+            {"$merge": {
+                "into": self.collection.name,
+                "on": ["label", "day"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }}
+        ], allowDiskUse=True)
+
+        result = self.collection.delete_many({"archived": {"$ne": 1}, "rebuilt_at": {"$ne": stamp}})
+        logger.info(f"事件活跃度汇总重建完成，删除了 {result.deleted_count} 条过期汇总。")
+
+    def add_posts(self, documents: list) -> None:
+        """
+        把新归入事件的帖子增量累加到汇总中
+        documents 需要包含 summary_embedding_cluster_label、event_title、created_at 和互动数
+        """
+        operations = []
+        for doc in documents:
+            created_at = doc.get("created_at")
+            if not isinstance(created_at, str):
+                continue
+            operations.append(UpdateOne(
+                {"label": doc["summary_embedding_cluster_label"], "day": created_at[:10]},
+                {
+                    "$set": {"event_title": doc.get("event_title", ""), "archived": 0},
+                    "$inc": {
+                        "count": 1,
+                        "attitudes": doc.get("attitudes_count", 0) or 0,
+                        "comments": doc.get("comments_count", 0) or 0,
+                        "reposts": doc.get("reposts_count", 0) or 0,
+                        f"hours.{created_at[11:13]}": 1
+                    }
+                },
+                upsert=True
+            ))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def archive(self, event_title: str, new_label: int) -> None:
+        """
+        事件归档时，把它的汇总移到新的编号下并标记为已归档
+        归档按标题进行，不同编号的事件可能同名，同一天的汇总需要合并后再写入新编号
+        """
+        documents = list(self.collection.find({"event_title": event_title, "archived": {"$ne": 1}}))
+        if not documents:
+            return
+
+        merged = {}
+        for doc in documents:
+            day = merged.setdefault(doc["day"], {
+                "label": new_label, "day": doc["day"], "event_title": event_title, "archived": 1,
+                "count": 0, "attitudes": 0, "comments": 0, "reposts": 0, "hours": {}
+            })
+            for field in ("count", "attitudes", "comments", "reposts"):
+                day[field] += doc.get(field, 0)
+            for hour, count in (doc.get("hours") or {}).items():
+                day["hours"][hour] = day["hours"].get(hour, 0) + count
+
+        # 先写入新编号下的汇总再删除旧的，删除前中断时残留的旧汇总会在下次重建时清理
+        self.collection.bulk_write([
+            ReplaceOne({"label": new_label, "day": day}, doc, upsert=True)
+            for day, doc in merged.items()
+        ], ordered=False)
+        self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in documents]}})
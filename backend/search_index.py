@@ -0,0 +1,283 @@
+import logging
+import re
+import time
+import unicodedata
+import zlib
+from collections import defaultdict
+import numpy as np
+from bson import Binary
+from pymongo import ASCENDING, ReplaceOne, ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# 连续的文字（汉字、字母、数字），标点和空白把文本切成若干段
+_RUN = re.compile(r"\w+")
+# 比任何天数都大的字符串，用作区间查询的上界
+_MAX = "\uffff"
+
+
+def normalize(text: str) -> str:
+    """全角转半角、统一小写"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def split_runs(text: str) -> list:
+    return _RUN.findall(normalize(text))
+
+
+def bigrams(text: str) -> set:
+    """按字切分的二元组（bigram），中文不需要分词"""
+    terms = set()
+    for run in split_runs(text):
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def encode_postings(docnos) -> bytes:
+    """升序文档编号 -> 差值编码后 zlib 压缩"""
+    docnos = np.asarray(docnos, dtype=np.int64)
+    return zlib.compress(np.diff(docnos, prepend=0).astype(np.uint32).tobytes())
+
+
+def decode_postings(data: bytes) -> np.ndarray:
+    return np.cumsum(np.frombuffer(zlib.decompress(data), dtype=np.uint32), dtype=np.int64)
+
+
+class SearchIndex:
+    """
+    帖子（text、summary）和事件标题的中文全文检索，基于字符二元组倒排索引
+    - 每篇帖子分配一个递增的整数编号 search_docno，记录在帖子文档上
+    - 倒排表存放在 weibo.search_postings，按“词 + 天”切分，_id 为 "<词>|<天>|<首个编号>"，
+      查询某个词在某段时间内的倒排表只需要一次 _id 区间扫描
+    - 每次建索引追加新的分段，compact() 把同一个“词 + 天”的分段合并
+    - 事件标题较少，单独存在 weibo.search_titles 中，每次生成标题后重建
+    """
+    # 每次从候选中取多少篇帖子做校验
+    FETCH_CHUNK = 500
+    # 为统计事件命中数最多检查多少篇候选帖子
+    EVENT_SCAN = 1000
+
+    def __init__(self, db):
+        self.posts = db['weibo']
+        self.activity = db['event_activity']
+        self.postings = db['search_postings']
+        self.titles = db['search_titles']
+        self.meta = db['search_meta']
+
+    def ensure_indexes(self) -> None:
+        """建索引所需的数据库索引，由后端在启动时调用"""
+        self.postings.create_index([("d", ASCENDING)])
+        self.posts.create_index([("search_docno", ASCENDING)], sparse=True)
+
+    def _reserve_docnos(self, count: int) -> int:
+        """预留 count 个连续编号，返回第一个"""
+        counter = self.meta.find_one_and_update(
+            {"_id": "docno"},
+            {"$inc": {"next": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["next"] - count
+
+    def index_posts(self, documents: list) -> int:
+        """
+        为一批帖子建立索引，documents 需要包含 _id、text、summary、created_at
+        返回建立索引的帖子数
+        """
+        documents = [doc for doc in documents if doc.get("text") or doc.get("summary")]
+        if not documents:
+            return 0
+
+        first_docno = self._reserve_docnos(len(documents))
+        postings = defaultdict(list)
+        for docno, doc in enumerate(documents, start=first_docno):
+            created_at = doc.get("created_at")
+            day = created_at[:10] if isinstance(created_at, str) else "0000-00-00"
+            for term in bigrams(f"{doc.get('text', '')}\n{doc.get('summary', '')}"):
+                postings[(term, day)].append(docno)
+
+        segments = [
+            {
+                "_id": f"{term}|{day}|{docnos[0]:012d}",
+                "t": term,
+                "d": day,
+                "n": len(docnos),
+                "p": Binary(encode_postings(docnos))
+            }
+            for (term, day), docnos in postings.items()
+        ]
+        # 先写倒排表再标记帖子，中途失败的帖子下次会重新建索引，残留的编号查不到帖子，不影响结果
+        # 没有任何二元组的帖子（只有一个字或只有标点）也分配编号，避免每次都被重新取出
+        if segments:
+            self.postings.insert_many(segments, ordered=False)
+        self.posts.bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"search_docno": docno}})
+            for docno, doc in enumerate(documents, start=first_docno)
+        ], ordered=False)
+        if postings:
+            self.meta.update_one(
+                {"_id": "dirty_days"},
+                {"$addToSet": {"days": {"$each": sorted({day for _, day in postings})}}},
+                upsert=True
+            )
+        return len(documents)
+
+    def compact(self) -> None:
+        """把新写入过分段的那些天里，同一个词的多个分段合并成一个"""
+        state = self.meta.find_one_and_update({"_id": "dirty_days"}, {"$set": {"days": []}})
+        days = state.get("days", []) if state else []
+
+        merged_count = 0
+        for day in days:
+            segments = defaultdict(list)
+            for segment in self.postings.find({"d": day}).sort("_id", ASCENDING):
+                segments[segment["t"]].append(segment)
+
+            operations, stale_ids = [], []
+            for term, term_segments in segments.items():
+                if len(term_segments) < 2:
+                    continue
+                docnos = np.unique(np.concatenate([decode_postings(s["p"]) for s in term_segments]))
+                # 合并结果写回第一个分段，读到合并过程中的重复编号会在查询时去重
+                operations.append(ReplaceOne({"_id": term_segments[0]["_id"]}, {
+                    "t": term,
+                    "d": day,
+                    "n": len(docnos),
+                    "p": Binary(encode_postings(docnos))
+                }))
+                stale_ids.extend(s["_id"] for s in term_segments[1:])
+            if operations:
+                self.postings.bulk_write(operations, ordered=False)
+                self.postings.delete_many({"_id": {"$in": stale_ids}})
+                merged_count += len(stale_ids)
+        logger.info(f"检查了 {len(days)} 天的倒排表，合并了 {merged_count} 个分段。")
+
+    def rebuild_titles(self) -> None:
+        """根据事件活跃度汇总中的事件（含已归档）重建事件标题索引"""
+        stamp = time.time()
+        events = defaultdict(list)
+        for event in self.activity.aggregate([
+            {"$group": {"_id": "$label", "event_title": {"$first": "$event_title"}, "archived": {"$max": "$archived"}}}
+        ]):
+            for term in bigrams(event["event_title"]):
+                events[term].append({"label": event["_id"], "event_title": event["event_title"], "archived": event["archived"]})
+
+        if events:
+            self.titles.bulk_write([
+                ReplaceOne({"_id": term}, {"events": term_events, "stamp": stamp}, upsert=True)
+                for term, term_events in events.items()
+            ], ordered=False)
+        self.titles.delete_many({"stamp": {"$ne": stamp}})
+        logger.info(f"事件标题索引重建完成，共 {len(events)} 个词。")
+
+    def _candidates(self, terms: set, start: str, end: str) -> list:
+        """
+        取出所有词在时间范围内的倒排表，按天求交集
+        返回按时间从新到旧排列的候选编号
+        """
+        lower = start or ""
+        upper = (end or _MAX) + "|" + _MAX
+        by_term = defaultdict(lambda: defaultdict(list))
+        for segment in self.postings.find(
+            {"$or": [{"_id": {"$gte": f"{term}|{lower}", "$lte": f"{term}|{upper}"}} for term in terms]},
+            {"t": 1, "d": 1, "p": 1}
+        ):
+            by_term[segment["t"]][segment["d"]].append(segment["p"])
+        if len(by_term) < len(terms):
+            return []
+
+        days = set.intersection(*(set(term_days) for term_days in by_term.values()))
+        candidates = []
+        for day in sorted(days, reverse=True):
+            lists = [
+                np.unique(np.concatenate([decode_postings(p) for p in by_term[term][day]]))
+                for term in terms
+            ]
+            lists.sort(key=len)
+            result = lists[0]
+            for docnos in lists[1:]:
+                result = np.intersect1d(result, docnos, assume_unique=True)
+                if not len(result):
+                    break
+            candidates.extend(result[::-1].tolist())
+        return candidates
+
+    def _title_events(self, terms: set, runs: list) -> dict:
+        """标题包含搜索词的事件"""
+        matched = None
+        found_terms = 0
+        events = {}
+        for doc in self.titles.find({"_id": {"$in": list(terms)}}):
+            found_terms += 1
+            labels = {event["label"] for event in doc["events"]}
+            matched = labels if matched is None else matched & labels
+            for event in doc["events"]:
+                events[event["label"]] = event
+        if not matched or found_terms < len(terms):
+            return {}
+        return {
+            label: events[label] for label in matched
+            if all(run in normalize(events[label]["event_title"]) for run in runs)
+        }
+
+    def search(self, query: str, start: str = None, end: str = None, limit: int = 20) -> dict:
+        """
+        检索帖子和事件
+        帖子按时间从新到旧排列；事件按标题是否命中、命中帖子数排列
+        start/end 为 YYYY-MM-DD，按帖子的发布日期过滤
+        """
+        runs = split_runs(query)
+        terms = bigrams(query)
+        if not terms:
+            return {"posts": [], "events": []}
+
+        candidates = self._candidates(terms, start, end)
+
+        # 倒排表只保证每个二元组都出现，逐篇确认整个搜索词都出现在文本中
+        posts = []
+        event_counts = defaultdict(int)
+        event_titles = {}
+        scanned = 0
+        while scanned < len(candidates) and (len(posts) < limit or scanned < self.EVENT_SCAN):
+            chunk = candidates[scanned:scanned + self.FETCH_CHUNK]
+            scanned += len(chunk)
+            found = {
+                doc["search_docno"]: doc for doc in self.posts.find(
+                    {"search_docno": {"$in": chunk}},
+                    {"id": 1, "text": 1, "summary": 1, "screen_name": 1, "created_at": 1,
+                     "attitudes_count": 1, "comments_count": 1, "reposts_count": 1,
+                     "event_title": 1, "summary_embedding_cluster_label": 1, "search_docno": 1}
+                )
+            }
+            for docno in chunk:
+                doc = found.get(docno)
+                if doc is None:
+                    continue
+                content = normalize(f"{doc.get('text', '')}\n{doc.get('summary', '')}")
+                if not all(run in content for run in runs):
+                    continue
+                if len(posts) < limit:
+                    posts.append(doc)
+                label = doc.get("summary_embedding_cluster_label")
+                if label is not None and label != -1 and doc.get("event_title"):
+                    event_counts[label] += 1
+                    event_titles[label] = doc["event_title"]
+
+        title_events = self._title_events(terms, runs)
+        if title_events and (start or end):
+            day_filter = {"$gte": start or "", "$lte": end or _MAX}
+            active = set(self.activity.distinct("label", {"label": {"$in": list(title_events)}, "day": day_filter}))
+            title_events = {label: event for label, event in title_events.items() if label in active}
+
+        events = [
+            {
+                "_id": label,
+                "event_title": title_events[label]["event_title"] if label in title_events else event_titles[label],
+                "title_match": label in title_events,
+                "matched_posts": event_counts.get(label, 0)
+            }
+            for label in set(event_counts) | set(title_events)
+        ]
+        events.sort(key=lambda event: (event["title_match"], event["matched_posts"]), reverse=True)
+
+        return {"posts": posts, "events": events[:limit]}
@@ -0,0 +1,93 @@
+"""
+读接口共用的 JSON 序列化和响应压缩
+一次遍历直接把 MongoDB 文档编码为 UTF-8 字节，ObjectId/datetime 的输出格式与 bson.json_util 默认的
+RELAXED 模式相同，装了 orjson 时使用 orjson，否则退回标准库 json
+"""
+import calendar
+import datetime
+import gzip
+import json
+from bson import ObjectId
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 小于这个大小的响应不压缩，压缩带来的收益抵不上开销
+MIN_COMPRESS_SIZE = 1024
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return {"$oid": str(obj)}
+    if isinstance(obj, datetime.datetime):
+        # 与 json_util 一致：naive datetime 视为 UTC；1970年以后输出带时区的 ISO 8601 字符串，之前输出毫秒数
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=datetime.timezone.utc)
+        millis = obj.microsecond // 1000
+        if obj >= _EPOCH:
+            tz_string = obj.strftime("%z") if obj.utcoffset() else "Z"
+            text = obj.strftime("%Y-%m-%dT%H:%M:%S") + (f".{millis:03d}" if millis else "")
+            return {"$date": text + tz_string}
+        return {"$date": {"$numberLong": str(calendar.timegm(obj.utctimetuple()) * 1000 + millis)}}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    """把包含 ObjectId/datetime 的对象序列化为 JSON 字节串"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def choose_encoding(accept_encoding: str):
+    """根据 Accept-Encoding 选择压缩方式，优先 br，其次 gzip，都不接受时返回 None"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, accept_encoding: str) -> tuple:
+    """按 Accept-Encoding 压缩响应体，返回 (响应体, Content-Encoding 或 None)"""
+    if len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding == "br":
+        return brotli.compress(body, quality=5), encoding
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6), encoding
+    return body, None
+
+
+def encode_response(obj, accept_encoding: str = "") -> tuple:
+    """
+    序列化并按需压缩，返回 (响应体, 需要额外设置的响应头)
+    """
+    body, encoding = compress(dumps(obj), accept_encoding)
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return body, headers
@@ -0,0 +1,240 @@
+import logging
+import os
+import json
+import time
+import numpy as np
+from pymongo import UpdateOne
+from info_processor import InfoProcessor
+import metrics
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class StreamWorker:
+    """
+    常驻进程：监听 weibo.weibo 的 change stream，把新写入的帖子按小批次依次做
+    摘要、embedding，并用增量预测归入已有事件（同时累加事件活跃度汇总、建立全文检索索引），
+    不必等下一次全量处理
+    每处理完一批就保存 resume token，重启后从断点继续，不会漏掉帖子
+    全量聚类会重新编号所有事件，每个小批次前检查 cluster_state 中的版本号，变化后重新加载事件中心
+    需要 MongoDB 以副本集模式运行（单节点副本集即可）
+    """
+    STATE_ID = "stream_worker"
+
+    def __init__(self, processor: InfoProcessor, config: dict):
+        """
+        Args:
+            processor: InfoProcessor实例
+            config: 配置字典，包含以下参数:
+                - STREAM_BATCH_SIZE: 每个小批次最多包含的帖子数
+                - STREAM_BATCH_SECONDS: 攒批的最长等待时间（秒）
+                - STREAM_ASSIGN_THRESHOLD: 与事件中心的余弦相似度达到该值才归入该事件
+                - STREAM_CENTROID_REFRESH: 聚类结果没有变化时，事件中心的刷新间隔（秒）
+                - STREAM_CLUSTER_TIMEOUT: 全量聚类开始后超过这个时间（秒）仍未生成标题，不再暂停归类
+                - STREAM_METRICS_PORT: 提供 /metrics 的端口，为 0 时不启动
+        """
+        self.processor = processor
+        self.collection = processor.collection
+        self.state = processor.db['stream_state']
+        self.batch_size = config.get('STREAM_BATCH_SIZE', 50)
+        self.batch_seconds = config.get('STREAM_BATCH_SECONDS', 5)
+        self.assign_threshold = config.get('STREAM_ASSIGN_THRESHOLD', 0.8)
+        self.centroid_refresh = config.get('STREAM_CENTROID_REFRESH', 600)
+        self.cluster_timeout = config.get('STREAM_CLUSTER_TIMEOUT', 3600)
+        self.metrics_port = config.get('STREAM_METRICS_PORT', 0)
+
+        self.centroids = None
+        self.centroid_labels = []
+        self.centroid_titles = []
+        self.centroids_loaded_at = 0
+        self.cluster_generation = None
+
+    def load_resume_token(self):
+        state = self.state.find_one({"_id": self.STATE_ID})
+        return state.get("resume_token") if state else None
+
+    def save_resume_token(self, token) -> None:
+        self.state.update_one(
+            {"_id": self.STATE_ID},
+            {"$set": {"resume_token": token, "updated_at": time.time()}},
+            upsert=True
+        )
+
+    def check_clusters(self) -> bool:
+        """
+        聚类结果变化或到了刷新间隔时重新加载事件中心
+        全量聚类进行中（已重新编号、尚未生成标题）时返回 False，这期间不做归类；
+        超过 cluster_timeout 仍未结束的视为中断，继续归类
+        """
+        state = self.processor.cluster_state.find_one({"_id": "clusters"}) or {}
+        if state.get("in_progress"):
+            elapsed = time.time() - state.get("started_at", 0)
+            if elapsed < self.cluster_timeout:
+                logger.info("全量聚类进行中，本批次不做归类。")
+                return False
+            logger.warning(f"全量聚类已开始 {elapsed:.0f} 秒仍未生成标题，忽略该状态继续归类，请检查聚类流程。")
+        generation = state.get("generation")
+        if generation != self.cluster_generation or time.time() - self.centroids_loaded_at > self.centroid_refresh:
+            self.refresh_centroids(generation)
+        return True
+
+    def refresh_centroids(self, generation=None) -> None:
+        """
+        计算每个活跃事件（已有标题、未归档）在当前embedding空间中的中心向量
+        generation 为读取时 cluster_state 中的版本号
+        """
+        documents = self.collection.find(
+            {
+                "summary_embedding_cluster_label": {"$exists": True, "$ne": -1},
+                "event_title": {"$exists": True},
+                "archived": {"$ne": 1},
+                "summary_embedding_space": {"$in": self.processor.embedding_spaces}
+            },
+            {"summary_embedding": 1, "summary_embedding_cluster_label": 1, "event_title": 1}
+        )
+
+        sums, counts, titles = {}, {}, {}
+        for doc in documents:
+            label = doc["summary_embedding_cluster_label"]
+            vector = np.asarray(doc["summary_embedding"], dtype=np.float32)
+            if label in sums and sums[label].shape != vector.shape:
+                continue
+            sums[label] = sums[label] + vector if label in sums else vector
+            counts[label] = counts.get(label, 0) + 1
+            titles[label] = doc["event_title"]
+
+        self.centroid_labels = list(sums)
+        self.centroid_titles = [titles[label] for label in self.centroid_labels]
+        if self.centroid_labels:
+            centroids = np.stack([sums[label] / counts[label] for label in self.centroid_labels])
+            self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+        else:
+            self.centroids = None
+        self.centroids_loaded_at = time.time()
+        self.cluster_generation = generation
+        logger.info(f"已加载 {len(self.centroid_labels)} 个活跃事件的中心向量。")
+
+    @metrics.stage("stream_assign")
+    def assign_to_events(self, documents: list) -> set:
+        """
+        增量预测：把新帖子归入最相似的已有事件，相似度不足的留给下一次全量聚类
+        只处理还没有聚类编号的帖子：崩溃后重放的批次、已被全量聚类处理过的帖子都不会重复归类
+        返回本次新归入事件的文档_id集合，只有这些帖子需要累加到活跃度汇总
+        """
+        documents = [doc for doc in documents if "summary_embedding_cluster_label" not in doc]
+        if not documents or not self.check_clusters() or self.centroids is None:
+            return set()
+
+        X = np.array([doc["summary_embedding"] for doc in documents], dtype=np.float32)
+        if X.shape[1] != self.centroids.shape[1]:
+            logger.warning(f"新帖子的embedding维度 {X.shape[1]} 与事件中心 {self.centroids.shape[1]} 不一致，跳过归类。")
+            return set()
+        X = X / np.linalg.norm(X, axis=1, keepdims=True)
+        similarities = X @ self.centroids.T
+        best = similarities.argmax(axis=1)
+
+        operations = []
+        assigned = set()
+        for doc, index, similarity in zip(documents, best, similarities[np.arange(len(best)), best]):
+            if similarity < self.assign_threshold:
+                continue
+            operations.append(UpdateOne(
+                {"_id": doc["_id"], "summary_embedding_cluster_label": {"$exists": False}},
+                {"$set": {
+                    "summary_embedding_cluster_label": self.centroid_labels[index],
+                    "event_title": self.centroid_titles[index]
+                }}
+            ))
+            assigned.add(doc["_id"])
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        metrics.STAGE_DOCUMENTS.inc(len(assigned), stage="stream_assign", result="assigned")
+        metrics.STAGE_DOCUMENTS.inc(len(documents) - len(assigned), stage="stream_assign", result="unassigned")
+        return assigned
+
+    @metrics.stage("stream_batch")
+    def process(self, changes: list) -> None:
+        """处理一个小批次的 insert 事件"""
+        documents = [change["fullDocument"] for change in changes if change.get("fullDocument")]
+        ids = [doc["_id"] for doc in documents]
+
+        # 从数据库重新读取，跳过已经在离线批次里等待结果的帖子
+        self.processor.summarize_documents(list(self.collection.find(
+            {"_id": {"$in": ids}, "summary": {"$exists": False}, "summary_batch_id": {"$exists": False}},
+            {"_id": 1, "text": 1}
+        )))
+        self.processor.embed_documents(list(self.collection.find(
+            {"_id": {"$in": ids}, "summary": {"$exists": True}, "summary_embedding": {"$exists": False},
+             "embedding_batch_id": {"$exists": False}},
+            {"_id": 1, "summary": 1}
+        )))
+        assigned = self.assign_to_events(list(self.collection.find(
+            {"_id": {"$in": ids}, "summary_embedding": {"$exists": True}},
+            {"_id": 1, "summary_embedding": 1, "summary_embedding_cluster_label": 1}
+        )))
+        self.processor.search_index.index_posts(list(self.collection.find(
+            {"_id": {"$in": ids}, "summary": {"$exists": True}, "search_docno": {"$exists": False}},
+            {"_id": 1, "text": 1, "summary": 1, "created_at": 1}
+        )))
+        self.processor.rollups.add_posts(list(self.collection.find(
+            {"_id": {"$in": list(assigned)}},
+            {"summary_embedding_cluster_label": 1, "event_title": 1, "created_at": 1,
+             "attitudes_count": 1, "comments_count": 1, "reposts_count": 1}
+        )))
+
+        # 写入数据库（clusterTime）到处理完成的延迟
+        now = time.time()
+        latencies = []
+        for change in changes:
+            latency = now - change["clusterTime"].time
+            latencies.append(latency)
+            result = "assigned" if change["documentKey"]["_id"] in assigned else "unassigned"
+            metrics.STREAM_LATENCY_SECONDS.observe(latency, result=result)
+        logger.info(
+            f"处理了 {len(changes)} 篇新帖子，归入事件 {len(assigned)} 篇，"
+            f"延迟中位数 {np.median(latencies):.1f}s，最大 {max(latencies):.1f}s"
+        )
+
+    def run(self) -> None:
+        if self.metrics_port:
+            metrics.start_http_server(self.metrics_port)
+        self.check_clusters()
+
+        resume_token = self.load_resume_token()
+        logger.info("从断点继续监听" if resume_token else "开始监听新写入的帖子")
+        with self.collection.watch(
+            [{"$match": {"operationType": "insert"}}],
+            resume_after=resume_token,
+            max_await_time_ms=1000
+        ) as stream:
+            buffer = []
+            batch_started = time.time()
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    if not buffer:
+                        batch_started = time.time()
+                    buffer.append(change)
+                if buffer and (len(buffer) >= self.batch_size or time.time() - batch_started >= self.batch_seconds):
+                    self.process(buffer)
+                    # 整批处理完成后才推进断点，崩溃重启时会重新处理这一批
+                    self.save_resume_token(buffer[-1]["_id"])
+                    buffer = []
+
+
+if __name__ == "__main__":
+    # 用法: python backend/stream_worker.py
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('log/stream_worker.log', encoding='utf-8')
+        ]
+    )
+    with open(os.path.join(current_dir, "config.json"), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    metrics.configure(trace_spans=config.get('TRACE_SPANS', False))
+    StreamWorker(InfoProcessor(config), config).run()
@@ -0,0 +1,83 @@
+"""
+比较 embedding 后端：吞吐（docs/sec）以及在合成语料上的聚类质量
+聚类质量用 HDBSCAN 结果与真实事件编号的调整兰德指数（ARI）和噪声比例衡量
+
+用法:
+    python bench/bench_embedding.py --providers openai local --events 40 --posts 25
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import hdbscan
+from dotenv import load_dotenv
+from openai import OpenAI
+from sklearn.metrics import adjusted_rand_score
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, os.path.join(root_dir, 'backend'))
+load_dotenv(os.path.join(root_dir, '.env'))
+
+from embedding_provider import OpenAIEmbeddingProvider, LocalEmbeddingProvider
+from synthetic import generate_posts
+
+
+def create_provider(name: str, config: dict):
+    if name == "openai":
+        client = OpenAI(api_key=os.getenv('API_KEY'))
+        return OpenAIEmbeddingProvider(
+            lambda endpoint, model, **kwargs: client.embeddings.create(model=model, **kwargs),
+            config['EMBED_MODEL'],
+            batch_size=config.get('EMBED_BATCH_SIZE', 64)
+        )
+    return LocalEmbeddingProvider(
+        config.get('LOCAL_EMBED_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2'),
+        batch_size=config.get('EMBED_BATCH_SIZE', 64),
+        threads=config.get('LOCAL_EMBED_THREADS', 4)
+    )
+
+
+def run(provider, posts: list, config: dict) -> dict:
+    texts = [post["summary"] for post in posts]
+    start = time.perf_counter()
+    embeddings = []
+    # 与 InfoProcessor.embed_documents 相同，每次传入后端的 chunk_size 条文本
+    for i in range(0, len(texts), provider.chunk_size):
+        embeddings.extend(provider.embed(texts[i:i + provider.chunk_size]))
+    elapsed = time.perf_counter() - start
+
+    X = np.array(embeddings, dtype=np.float32)
+    labels = hdbscan.HDBSCAN(
+        min_cluster_size=config['MIN_CLUSTER_SIZE'],
+        min_samples=config['MIN_SAMPLES'],
+    ).fit_predict(X)
+    truth = [post["event"] for post in posts]
+
+    return {
+        "space": provider.space,
+        "dim": X.shape[1],
+        "docs_per_sec": round(len(texts) / elapsed, 1),
+        "clusters": len(set(labels)) - (1 if -1 in labels else 0),
+        "events": len(set(truth)),
+        "ari": round(adjusted_rand_score(truth, labels), 4),
+        "noise_ratio": round(float(np.mean(labels == -1)), 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--providers", nargs="+", default=["openai", "local"], choices=["openai", "local"])
+    parser.add_argument("--events", type=int, default=40)
+    parser.add_argument("--posts", type=int, default=25)
+    args = parser.parse_args()
+
+    with open(os.path.join(root_dir, 'backend', 'config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    posts = generate_posts(n_events=args.events, posts_per_event=args.posts)
+
+    for name in args.providers:
+        result = run(create_provider(name, config), posts, config)
+        print(json.dumps(result, ensure_ascii=False))
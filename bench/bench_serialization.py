@@ -0,0 +1,73 @@
+"""
+读接口序列化基准：一个包含 5000 条帖子的事件（/api/event_posts 的返回）
+比较原来的 json_util.dumps -> json.loads -> JSONResponse 三次序列化、api/ 中的 json_util.dumps、
+以及共用的单次序列化，并给出 gzip/br 压缩后的传输字节数
+
+用法:
+    python bench/bench_serialization.py --posts 5000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from bson import ObjectId, json_util
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, os.path.join(root_dir, 'backend'))
+
+import serialization
+from synthetic import generate_posts
+
+PROJECTED_FIELDS = ("id", "text", "screen_name", "attitudes_count", "comments_count", "reposts_count", "created_at")
+
+
+def timeit(func, repeat: int) -> float:
+    """返回多次运行中最快一次的耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def triple_pass(payload):
+    json_str = json_util.dumps(payload)
+    json_data = json.loads(json_str)
+    # JSONResponse.render
+    return json.dumps(json_data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # 与 get_event_posts 的 $project 一致
+    posts = [
+        dict({"_id": ObjectId(), "response": 0}, **{field: post[field] for field in PROJECTED_FIELDS})
+        for post in generate_posts(n_events=1, posts_per_event=args.posts)
+    ]
+    payload = {"posts": posts}
+
+    print(f"serializer: {'orjson' if serialization.orjson else 'json'}, brotli: {serialization.brotli is not None}")
+    print(f"{'method':<28}{'ms':>10}")
+    for name, func in [
+        ("json_util+loads+JSONResponse", lambda: triple_pass(payload)),
+        ("json_util.dumps", lambda: json_util.dumps(payload).encode()),
+        ("serialization.dumps", lambda: serialization.dumps(payload)),
+    ]:
+        print(f"{name:<28}{timeit(func, args.repeat):>10.2f}")
+
+    body = serialization.dumps(payload)
+    print(f"\n{'encoding':<28}{'bytes':>10}{'ms':>10}")
+    print(f"{'identity':<28}{len(body):>10}{0:>10.2f}")
+    for encoding in ("gzip", "br"):
+        if encoding == "br" and serialization.brotli is None:
+            continue
+        compressed, _ = serialization.compress(body, encoding)
+        elapsed = timeit(lambda: serialization.compress(body, encoding), args.repeat)
+        print(f"{encoding:<28}{len(compressed):>10}{elapsed:>10.2f}")
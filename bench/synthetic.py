@@ -0,0 +1,81 @@
+"""
+合成语料：按“地点 + 事件类型”生成若干事件，每个事件下生成若干条措辞不同的微博
+事件数超过地点和事件类型的组合数（240）时，在地点后加上区县名区分
+字段与爬虫写入的文档一致（text、summary、created_at、互动数等），另外带有真实事件编号 event，
+供各个基准测试使用
+"""
+import datetime
+import random
+
+PLACES = [
+    "北京", "上海", "广州", "深圳", "成都", "重庆", "武汉", "西安", "杭州", "南京",
+    "天津", "苏州", "郑州", "长沙", "沈阳", "青岛", "昆明", "大连", "厦门", "合肥",
+    "福州", "济南", "哈尔滨", "长春", "南昌", "贵阳", "南宁", "兰州", "太原", "石家庄",
+]
+
+EVENT_TYPES = [
+    ("暴雨", ["遭遇特大暴雨", "暴雨导致城区内涝", "启动暴雨红色预警", "强降雨致多条道路积水"]),
+    ("地铁", ["地铁线路突发故障停运", "地铁早高峰信号故障", "地铁列车临时清客", "地铁新线开通试运营"]),
+    ("食品", ["通报一起食品安全事件", "餐馆被查出使用过期食材", "学校食堂食品问题引关注", "市场监管部门查处问题食品"]),
+    ("火灾", ["一居民楼发生火灾", "工厂突发火情无人员伤亡", "商场起火消防紧急处置", "高层住宅火灾原因公布"]),
+    ("交通", ["高速公路发生多车追尾", "交通事故致道路拥堵", "公交车与货车相撞", "重点路段实施交通管制"]),
+    ("教育", ["发布中考改革新方案", "多所学校调整招生政策", "教育局回应校外培训问题", "高校宣布扩大招生规模"]),
+    ("医疗", ["医院回应患者投诉", "医保新政正式实施", "流感患者数量明显增加", "卫健委发布健康提示"]),
+    ("房产", ["出台楼市调控新政", "房贷利率下调", "烂尾楼项目复工", "公积金政策调整"]),
+]
+
+FILLERS = [
+    "据当地媒体报道，", "网友拍摄的视频显示，", "记者从有关部门获悉，", "多位市民反映，",
+    "今天上午，", "昨晚，", "据官方通报，", "",
+]
+
+TAILS = [
+    "目前相关部门已介入调查。", "具体情况仍在进一步核实中。", "事件引发网友热议。",
+    "有关方面表示将持续跟进。", "后续进展本台将持续关注。", "",
+]
+
+# 组合用完后依次加在地点后面，再用完时加上编号
+DISTRICTS = [
+    "东城区", "西城区", "朝阳区", "海淀区", "南山区", "福田区", "天河区", "越秀区", "武侯区", "锦江区",
+    "江汉区", "雁塔区", "西湖区", "鼓楼区", "和平区", "市南区", "高新区", "经开区", "新区", "老城区",
+]
+
+SCREEN_NAMES = ["人民日报", "新京报", "澎湃新闻", "央视新闻", "头条新闻", "财经网", "中国新闻网", "南方都市报"]
+
+
+def generate_posts(n_events: int = 40, posts_per_event: int = 25, seed: int = 0,
+                   start: datetime.datetime = None, days: int = 14) -> list:
+    """
+    生成 n_events * posts_per_event 条合成微博，打乱顺序后返回
+    每个事件的帖子集中在随机的几天内
+    """
+    rng = random.Random(seed)
+    start = start or datetime.datetime(2025, 1, 1)
+    combos = [(place, event_type) for place in PLACES for event_type in EVENT_TYPES]
+    rng.shuffle(combos)
+
+    posts = []
+    for event_id in range(n_events):
+        place, (_, actions) = combos[event_id % len(combos)]
+        round_index = event_id // len(combos)
+        if round_index:
+            district = DISTRICTS[(round_index - 1) % len(DISTRICTS)]
+            number = (round_index - 1) // len(DISTRICTS)
+            place = f"{place}{district}" + (str(number + 1) if number else "")
+        event_start = start + datetime.timedelta(days=rng.randrange(days), hours=rng.randrange(24))
+        for _ in range(posts_per_event):
+            action = rng.choice(actions)
+            created_at = event_start + datetime.timedelta(minutes=rng.randrange(3 * 24 * 60))
+            posts.append({
+                "id": str(rng.randrange(10 ** 15, 10 ** 16)),
+                "screen_name": rng.choice(SCREEN_NAMES),
+                "text": f"{rng.choice(FILLERS)}{place}{action}，{rng.choice(TAILS)}",
+                "summary": f"{place}{action}",
+                "created_at": created_at.isoformat(timespec="seconds"),
+                "attitudes_count": rng.randrange(10000),
+                "comments_count": rng.randrange(2000),
+                "reposts_count": rng.randrange(5000),
+                "event": event_id,
+            })
+    rng.shuffle(posts)
+    return posts
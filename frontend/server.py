@@ -1,12 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo import MongoClient
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import uvicorn
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response
 from dotenv import load_dotenv
 import os
+import sys
 
 # 加载环境变量
 # 获取当前文件的目录
@@ -16,6 +17,14 @@ root_dir = os.path.dirname(current_dir)
 # 加载根目录下的 .env 文件
 load_dotenv(os.path.join(root_dir, '.env'))
 
+# 与后端共用的模块（指标、序列化等）放在 backend 目录下
+sys.path.insert(0, os.path.join(root_dir, 'backend'))
+import metrics
+import serialization
+from search_index import SearchIndex, bigrams
+
+metrics.configure(trace_spans=os.getenv('TRACE_SPANS', '').lower() in ('1', 'true'))
+
 app = FastAPI()
 
 # 允许跨域请求
@@ -27,13 +36,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按路由统计请求耗时
+app.middleware("http")(metrics.http_middleware)
+
 # MongoDB 连接
-client = MongoClient(os.getenv('MONGO_URI'))
+client = MongoClient(os.getenv('MONGO_URI'), event_listeners=[metrics.MongoCommandListener()])
 db = client['weibo']
 collection = db['weibo']
+# 按“事件 + 天”预先汇总的活跃度，由后端维护
+activity = db['event_activity']
+
+TRENDING_SORTS = ("count", "attitudes", "comments", "reposts")
+
+# 全文检索（字符二元组倒排索引），由后端维护
+search_index = SearchIndex(db)
+
+def json_response(request: Request, content) -> Response:
+    """
+    一次序列化直接输出JSON字节，并根据 Accept-Encoding 压缩
+    """
+    body, headers = serialization.encode_response(content, request.headers.get("accept-encoding", ""))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Prometheus 指标
+    """
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/api/events")
-async def get_events():
+async def get_events(request: Request):
     """
     获取事件列表
     """
@@ -71,10 +104,10 @@ async def get_events():
         
         if not documents:
             print("没有找到任何事件数据")
-            return {"events": []}
+            return json_response(request, {"events": []})
             
         print(f"成功获取到 {len(documents)} 个事件")
-        return {"events": documents}
+        return json_response(request, {"events": documents})
         
     except Exception as e:
         print(f"获取事件数据失败: {str(e)}")
@@ -98,7 +131,7 @@ async def test_connection():
         )
 
 @app.get("/api/valid_clusters")
-async def get_valid_clusters():
+async def get_valid_clusters(request: Request):
     """
     获取有效的聚类信息，基于 summary_embedding_cluster_label。
     """
@@ -134,17 +167,17 @@ async def get_valid_clusters():
         
         if not documents:
             print("没有找到任何有效聚类数据")
-            return {"clusters": []}
+            return json_response(request, {"clusters": []})
             
         print(f"成功获取到 {len(documents)} 个有效聚类（基于 summary_embedding_cluster_label）")
-        return {"clusters": documents}
+        return json_response(request, {"clusters": documents})
         
     except Exception as e:
         print(f"获取聚类数据失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/event_posts/{event_id}")
-async def get_event_posts(event_id: int):
+async def get_event_posts(event_id: int, request: Request):
     """
     根据 summary_embedding_cluster_label（event_id）获取对应帖子
     """
@@ -176,11 +209,8 @@ async def get_event_posts(event_id: int):
             posts = list(collection.aggregate(pipeline, allowDiskUse=True))
             print(f"成功获取到 {len(posts)} 条帖子")
             
-            # 使用 json_util 处理 MongoDB 的特殊类型
-            json_str = json_util.dumps({"posts": posts})
-            json_data = json.loads(json_str)
-            
-            return JSONResponse(content=json_data)
+            # 一次序列化处理 MongoDB 的特殊类型（ObjectId 等）
+            return json_response(request, {"posts": posts})
             
         except Exception as db_error:
             print(f"数据库查询失败: {str(db_error)}")
@@ -193,6 +223,83 @@ async def get_event_posts(event_id: int):
             detail=f"获取帖子失败: {str(e)}, 事件ID: {event_id}"
         )
 
+@app.get("/api/trending")
+async def get_trending(request: Request, day: str = None, limit: int = Query(20, ge=1, le=100), sort: str = "count"):
+    """
+    某一天（默认今天）最活跃的事件，直接读取事件活跃度汇总
+    sort 可选 count（帖子数）、attitudes、comments、reposts
+    """
+    if sort not in TRENDING_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort 只能是 {', '.join(TRENDING_SORTS)}")
+    try:
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        events = list(
+            activity.find(
+                {"day": day, "archived": {"$ne": 1}},
+                {"_id": 0, "label": 1, "event_title": 1, "count": 1, "attitudes": 1, "comments": 1, "reposts": 1, "hours": 1}
+            ).sort(sort, -1).limit(limit)
+        )
+        for event in events:
+            event["_id"] = event.pop("label")
+        return json_response(request, {"day": day, "events": events})
+
+    except Exception as e:
+        print(f"获取热门事件失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sparklines")
+async def get_sparklines(request: Request, days: int = Query(14, ge=1, le=90), end: str = None):
+    """
+    最近 days 天（截至 end，默认今天）每个事件每天的帖子数，用于时间线上的走势图
+    """
+    try:
+        end_day = date.fromisoformat(end) if end else datetime.now().date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的日期: {end}")
+    try:
+        day_list = [(end_day - timedelta(days=offset)).isoformat() for offset in reversed(range(days))]
+        day_index = {day: i for i, day in enumerate(day_list)}
+
+        events = {}
+        for doc in activity.find(
+            {"day": {"$gte": day_list[0], "$lte": day_list[-1]}, "archived": {"$ne": 1}},
+            {"_id": 0, "label": 1, "event_title": 1, "day": 1, "count": 1}
+        ):
+            event = events.setdefault(doc["label"], {
+                "_id": doc["label"],
+                "event_title": doc.get("event_title", ""),
+                "counts": [0] * days
+            })
+            event["counts"][day_index[doc["day"]]] = doc["count"]
+
+        return json_response(request, {"days": day_list, "events": list(events.values())})
+
+    except Exception as e:
+        print(f"获取事件走势失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/search")
+async def search(request: Request, q: str, start: str = None, end: str = None, limit: int = Query(20, ge=1, le=100)):
+    """
+    搜索帖子（text、summary）和事件标题，start/end 为 YYYY-MM-DD，按帖子发布日期过滤
+    """
+    if not bigrams(q):
+        raise HTTPException(status_code=400, detail="搜索词至少需要两个连续的字")
+    for day in (start, end):
+        if day:
+            try:
+                date.fromisoformat(day)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"无效的日期: {day}")
+    try:
+        result = search_index.search(q, start=start, end=end, limit=limit)
+        print(f"搜索 {q}: {len(result['posts'])} 条帖子, {len(result['events'])} 个事件")
+        return json_response(request, result)
+
+    except Exception as e:
+        print(f"搜索失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # 静态文件挂载；确保 dist 目录中存在 index.html 和相关静态文件
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)  # 获取上一级目录
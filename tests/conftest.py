@@ -0,0 +1,66 @@
+"""
+测试共用的夹具：本地的 OpenAI 替身服务，以及用 mongomock 代替的 MongoDB
+运行: pip install pytest mongomock && python -m pytest tests
+"""
+import json
+import os
+import sys
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, os.path.join(root_dir, 'backend'))
+sys.path.insert(0, current_dir)
+
+mongomock = pytest.importorskip("mongomock")
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.results import BulkWriteResult
+
+import info_processor
+from fake_openai import FakeOpenAI
+
+
+def _bulk_write(self, requests, ordered=True, **kwargs):
+    """mongomock 的 bulk_write 与新版 pymongo 的写操作对象不兼容，这里逐条执行"""
+    counts = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0, "upserted": []}
+    for request in requests:
+        if isinstance(request, ReplaceOne):
+            result = self.replace_one(request._filter, request._doc, upsert=request._upsert)
+        elif isinstance(request, UpdateOne):
+            result = self.update_one(request._filter, request._doc, upsert=request._upsert)
+        else:
+            result = self.update_many(request._filter, request._doc, upsert=request._upsert)
+        counts["nMatched"] += result.matched_count
+        counts["nModified"] += result.modified_count
+        counts["nUpserted"] += 1 if result.upserted_id is not None else 0
+    return BulkWriteResult(counts, True)
+
+
+mongomock.Collection.bulk_write = _bulk_write
+
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    server = FakeOpenAI()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def config(tmp_path):
+    with open(os.path.join(root_dir, 'backend', 'config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['BATCH_DIR'] = str(tmp_path / 'batch')
+    config['OPENAI_MAX_RETRIES'] = 0
+    return config
+
+
+@pytest.fixture
+def processor(fake_openai, config, monkeypatch):
+    fake_openai.reset()
+    monkeypatch.setenv('API_KEY', 'sk-test')
+    monkeypatch.setenv('OPENAI_BASE_URL', fake_openai.url)
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(info_processor, 'MongoClient', lambda *args, **kwargs: client)
+    return info_processor.InfoProcessor(config)
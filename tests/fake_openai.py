@@ -0,0 +1,163 @@
+"""
+本地的 OpenAI 接口替身，测试时通过 OPENAI_BASE_URL 指向它
+
+摘要请求按文本中的标记返回不同结果，用来覆盖批量摘要的校验和重试：
+- 含 "[缺失]" 的文本第一次请求时不返回结果
+- 含 "[无效]" 的文本第一次请求时返回不合法的元素
+- 含 "[整数]" 的文本以整数形式返回编号
+
+离线批处理：创建的批次在第一次查询时完成，按请求文件逐行生成结果文件，
+含 "[出错]" 的请求写入错误文件
+"""
+import email
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MISSING = "[缺失]"
+INVALID = "[无效]"
+INT_ID = "[整数]"
+BATCH_ERROR = "[出错]"
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        self.reset()
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+    def reset(self) -> None:
+        self.requests = []
+        self.seen = {}
+        self.files = {}
+        self.batches = {}
+
+    def chat_requests(self) -> list:
+        return [body for path, body in self.requests if path.endswith("/chat/completions")]
+
+    def chat_result(self, body: dict) -> dict:
+        """按批量摘要的格式逐条返回结果"""
+        prompt = body["messages"][0]["content"]
+        results = []
+        for item_id, text in re.findall(r"^\[(\d+)\]\n(.*?)(?=\n\n\[\d+\]\n|\Z)", prompt, re.M | re.S):
+            count = self.seen.get(text, 0)
+            self.seen[text] = count + 1
+            if MISSING in text and count == 0:
+                continue
+            if INVALID in text and count == 0:
+                results.append({"id": item_id, "summary": "", "response": 3})
+                continue
+            results.append({
+                "id": int(item_id) if INT_ID in text else item_id,
+                "summary": f"摘要{text[:10]}",
+                "response": 1 if "政府" in text else 0,
+                "org": "应急管理局" if "政府" in text else ""
+            })
+        content = json.dumps({"results": results}, ensure_ascii=False)
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(content), "total_tokens": len(prompt) + len(content)}
+        }
+
+    def embedding_result(self, body: dict) -> dict:
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        return {
+            "object": "list", "model": body["model"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": [float(len(text)), 1.0, 0.5]}
+                for i, text in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": len(texts), "total_tokens": len(texts)}
+        }
+
+    def add_file(self, lines: list) -> str:
+        file_id = f"file-{uuid.uuid4().hex}"
+        self.files[file_id] = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+        return file_id
+
+    def run_batch(self, batch: dict) -> None:
+        """逐行执行批量请求，生成结果文件和错误文件"""
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            request = json.loads(line)
+            if BATCH_ERROR in json.dumps(request["body"], ensure_ascii=False):
+                errors.append({"custom_id": request["custom_id"], "response": {"status_code": 400, "body": {}}})
+                continue
+            body = (self.chat_result if request["url"].endswith("/chat/completions") else self.embedding_result)(request["body"])
+            output.append({"id": f"req-{len(output)}", "custom_id": request["custom_id"],
+                           "response": {"status_code": 200, "body": body}, "error": None})
+        batch["output_file_id"] = self.add_file(output) if output else None
+        batch["error_file_id"] = self.add_file(errors) if errors else None
+        batch["status"] = "completed"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send(self, payload: dict) -> None:
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path.startswith("/v1/files/") and path.endswith("/content"):
+                    data = fake.files[path.split("/")[-2]]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                if path == "/v1/batches":
+                    batches = sorted(fake.batches.values(), key=lambda batch: batch["created_at"], reverse=True)
+                    return self.send({"object": "list", "data": batches, "has_more": False})
+                batch = fake.batches[path.split("/")[-1]]
+                if batch["status"] == "in_progress":
+                    fake.run_batch(batch)
+                return self.send(batch)
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.path.endswith("/files"):
+                    message = email.message_from_bytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + raw
+                    )
+                    part = next(p for p in message.get_payload() if p.get_param("name", header="content-disposition") == "file")
+                    file_id = f"file-{uuid.uuid4().hex}"
+                    fake.files[file_id] = part.get_payload(decode=True)
+                    return self.send({"id": file_id, "object": "file", "bytes": len(fake.files[file_id]),
+                                      "created_at": int(time.time()), "filename": "batch.jsonl", "purpose": "batch"})
+
+                body = json.loads(raw)
+                fake.requests.append((self.path, body))
+                if self.path.endswith("/batches"):
+                    batch_id = f"batch_{uuid.uuid4().hex}"
+                    fake.batches[batch_id] = {
+                        "id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+                        "input_file_id": body["input_file_id"], "completion_window": body["completion_window"],
+                        "status": "in_progress", "created_at": int(time.time()), "metadata": body.get("metadata"),
+                        "output_file_id": None, "error_file_id": None
+                    }
+                    return self.send(fake.batches[batch_id])
+                if self.path.endswith("/chat/completions"):
+                    return self.send(fake.chat_result(body))
+                return self.send(fake.embedding_result(body))
+
+        return Handler
@@ -0,0 +1,141 @@
+import pytest
+from batch_processor import BatchProcessor
+from fake_openai import BATCH_ERROR
+
+
+@pytest.fixture
+def batch_processor(processor, config):
+    config['BATCH_MAX_REQUESTS'] = 4
+    return BatchProcessor(processor, config)
+
+
+def insert_posts(processor, count: int, error_index: int = None) -> None:
+    processor.collection.insert_many([
+        {"text": f"第{i}条新闻" + (BATCH_ERROR if i == error_index else "")} for i in range(count)
+    ])
+
+
+def test_submit_poll_ingest(batch_processor, processor, fake_openai):
+    insert_posts(processor, 10, error_index=3)
+
+    job_ids = batch_processor.submit("summary")
+    assert len(job_ids) == 3
+    assert batch_processor.submit("summary") == []
+    assert processor.collection.count_documents({"summary_batch_id": {"$exists": True}}) == 10
+    # 在批次里等待结果的文档不会再被实时摘要重复处理
+    processor.summary_batch()
+    assert fake_openai.chat_requests() == []
+
+    statuses = batch_processor.poll()
+    assert set(statuses) == set(job_ids)
+    assert set(statuses.values()) == {"ingested"}
+    assert processor.collection.count_documents({"summary": {"$exists": True}}) == 9
+    # 出错的请求解除标记，下次重新提交
+    assert processor.collection.count_documents({"summary_batch_id": {"$exists": True}}) == 0
+    assert batch_processor.submit("summary") != []
+
+    job_ids = batch_processor.submit("embedding")
+    batch_processor.poll()
+    assert processor.collection.count_documents({"summary_embedding": {"$exists": True}}) == 9
+    assert all(job["status"] == "ingested" for job in batch_processor.jobs.find({"_id": {"$in": job_ids}}))
+
+
+def test_ingest_resumes_from_checkpoint(batch_processor, processor, fake_openai, monkeypatch):
+    insert_posts(processor, 4)
+    job_id, = batch_processor.submit("summary")
+    job = batch_processor.jobs.find_one({"_id": job_id})
+    batch = batch_processor.client.batches.retrieve(job["batch_id"])
+
+    flush = batch_processor._flush
+
+    def crash_after_first_flush(job, operations, line_count):
+        flush(job, operations, line_count)
+        raise SystemExit("写回中途退出")
+
+    monkeypatch.setattr(batch_processor, "_flush", crash_after_first_flush)
+    with pytest.raises(SystemExit):
+        batch_processor._ingest(job, batch.output_file_id, chunk_size=2)
+    monkeypatch.undo()
+
+    assert batch_processor.jobs.find_one({"_id": job_id})["ingested_lines"] == 2
+    assert processor.collection.count_documents({"summary": {"$exists": True}}) == 2
+
+    writes = []
+    bulk_write = processor.collection.bulk_write
+
+    def counting_bulk_write(operations, **kwargs):
+        writes.append(len(operations))
+        return bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(processor.collection, "bulk_write", counting_bulk_write)
+    assert batch_processor.poll() == {job_id: "ingested"}
+    # 从断点继续，只写回剩下的两条
+    assert writes == [2]
+    assert processor.collection.count_documents({"summary": {"$exists": True}}) == 4
+    assert batch_processor.jobs.find_one({"_id": job_id})["ingested_lines"] == 4
+
+
+def test_ingest_keeps_existing_summary(batch_processor, processor):
+    insert_posts(processor, 2)
+    batch_processor.submit("summary")
+    processor.collection.update_one({"text": "第0条新闻"}, {"$set": {"summary": "已有摘要"}})
+
+    batch_processor.poll()
+
+    assert processor.collection.find_one({"text": "第0条新闻"})["summary"] == "已有摘要"
+    assert processor.collection.find_one({"text": "第1条新闻"})["summary"] == "摘要第1条新闻"
+
+
+def test_batch_created_before_crash_is_recovered(batch_processor, processor, monkeypatch):
+    insert_posts(processor, 3)
+    create = batch_processor.client.batches.create
+
+    def crash_after_create(**kwargs):
+        create(**kwargs)
+        raise SystemExit("创建批次后退出")
+
+    monkeypatch.setattr(batch_processor.client.batches, "create", crash_after_create)
+    with pytest.raises(SystemExit):
+        batch_processor.submit("summary")
+    monkeypatch.undo()
+
+    job = batch_processor.jobs.find_one()
+    assert job["status"] == "submitting"
+    assert processor.collection.count_documents({"summary_batch_id": job["_id"]}) == 3
+    # 文档已标记，不会被重新提交
+    assert batch_processor.submit("summary") == []
+
+    assert batch_processor.poll() == {job["_id"]: "ingested"}
+    assert processor.collection.count_documents({"summary": {"$exists": True}}) == 3
+
+
+def test_submit_interrupted_before_create_is_released(batch_processor, processor, monkeypatch):
+    insert_posts(processor, 3)
+
+    def crash(**kwargs):
+        raise SystemExit("创建批次前退出")
+
+    monkeypatch.setattr(batch_processor.client.batches, "create", crash)
+    with pytest.raises(SystemExit):
+        batch_processor.submit("summary")
+    monkeypatch.undo()
+
+    job = batch_processor.jobs.find_one()
+    assert batch_processor.poll() == {job["_id"]: "submitting"}
+
+    monkeypatch.setattr(BatchProcessor, "SUBMIT_TIMEOUT", 0)
+    assert batch_processor.poll() == {job["_id"]: "failed"}
+    assert processor.collection.count_documents({"summary_batch_id": {"$exists": True}}) == 0
+    assert len(batch_processor.submit("summary")) == 1
+
+
+def test_embeddings_keep_the_space_they_were_submitted_in(batch_processor, processor, monkeypatch):
+    processor.collection.insert_many([{"summary": f"摘要{i}"} for i in range(3)])
+    submitted_space = processor.embedding_provider.space
+    batch_processor.submit("embedding")
+
+    # 批次完成前切换了 embedding 后端
+    monkeypatch.setattr(processor.embedding_provider, "space", "local:paraphrase-multilingual-MiniLM-L12-v2")
+    batch_processor.poll()
+
+    assert processor.collection.count_documents({"summary_embedding_space": submitted_space}) == 3
@@ -0,0 +1,50 @@
+import sys
+import types
+import numpy as np
+import pytest
+from embedding_provider import EmbeddingProvider, LocalEmbeddingProvider
+
+
+def test_embedding_provider_requires_embed():
+    with pytest.raises(TypeError):
+        EmbeddingProvider()
+
+
+def test_embed_documents_continues_after_write_failure(processor, monkeypatch):
+    processor.embedding_provider.chunk_size = 2
+    processor.collection.insert_many([{"summary": f"摘要{i}"} for i in range(4)])
+    bulk_write = processor.collection.bulk_write
+    calls = []
+
+    def flaky_bulk_write(operations, **kwargs):
+        calls.append(len(operations))
+        if len(calls) == 1:
+            raise RuntimeError("写入失败")
+        return bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(processor.collection, "bulk_write", flaky_bulk_write)
+
+    processor.summary_embedding()
+
+    assert calls == [2, 2]
+    assert processor.collection.count_documents({"summary_embedding": {"$exists": True}}) == 2
+
+
+def test_local_provider_spreads_each_call_over_all_threads(monkeypatch):
+    batches = []
+
+    class FakeSentenceTransformer:
+        def __init__(self, model_name, device=None):
+            pass
+
+        def encode(self, texts, **kwargs):
+            batches.append(len(texts))
+            return np.ones((len(texts), 3), dtype=np.float32)
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer))
+    provider = LocalEmbeddingProvider("fake-model", batch_size=8, threads=4)
+
+    assert provider.chunk_size == 32
+    embeddings = provider.embed([f"摘要{i}" for i in range(provider.chunk_size)])
+    assert len(embeddings) == 32
+    assert batches == [8, 8, 8, 8]
@@ -0,0 +1,23 @@
+def test_archive_merges_events_with_the_same_title(processor):
+    rollups = processor.rollups
+    rollups.collection.insert_many([
+        {"label": 1, "day": "2025-01-01", "event_title": "北京暴雨", "archived": 0,
+         "count": 2, "attitudes": 1, "comments": 0, "reposts": 0, "hours": {"08": 2}},
+        {"label": 2, "day": "2025-01-01", "event_title": "北京暴雨", "archived": 0,
+         "count": 3, "attitudes": 0, "comments": 4, "reposts": 1, "hours": {"08": 1, "09": 2}},
+        {"label": 2, "day": "2025-01-02", "event_title": "北京暴雨", "archived": 0,
+         "count": 1, "attitudes": 0, "comments": 0, "reposts": 0, "hours": {"10": 1}},
+        {"label": 3, "day": "2025-01-01", "event_title": "上海台风", "archived": 0,
+         "count": 5, "attitudes": 0, "comments": 0, "reposts": 0, "hours": {"08": 5}},
+    ])
+
+    rollups.archive("北京暴雨", 1234567)
+
+    archived = {doc["day"]: doc for doc in rollups.collection.find({"label": 1234567}, {"_id": 0})}
+    assert archived["2025-01-01"] == {
+        "label": 1234567, "day": "2025-01-01", "event_title": "北京暴雨", "archived": 1,
+        "count": 5, "attitudes": 1, "comments": 4, "reposts": 1, "hours": {"08": 3, "09": 2}
+    }
+    assert archived["2025-01-02"]["count"] == 1
+    assert rollups.collection.count_documents({"event_title": "北京暴雨"}) == 2
+    assert rollups.collection.count_documents({"label": 3}) == 1
@@ -0,0 +1,15 @@
+def test_index_posts_without_bigrams(processor):
+    processor.collection.insert_many([
+        {"text": "好", "summary": "！", "created_at": "2025-01-01T08:00:00"},
+        {"text": "北京暴雨", "summary": "暴雨", "created_at": "2025-01-01T09:00:00"},
+    ])
+
+    processor.index_search()
+    assert processor.collection.count_documents({"search_docno": {"$exists": False}}) == 0
+
+    processor.collection.insert_one({"text": "嗯", "summary": "…", "created_at": "2025-01-02T08:00:00"})
+    processor.index_search()
+    assert processor.collection.count_documents({"search_docno": {"$exists": False}}) == 0
+
+    result = processor.search_index.search("暴雨")
+    assert [post["text"] for post in result["posts"]] == ["北京暴雨"]
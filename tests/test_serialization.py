@@ -0,0 +1,25 @@
+import datetime
+import json
+import pytest
+from bson import ObjectId, json_util
+import serialization
+
+TZ_8 = datetime.timezone(datetime.timedelta(hours=8))
+
+
+@pytest.mark.parametrize("value", [
+    ObjectId("65a1b2c3d4e5f60718293a4b"),
+    datetime.datetime(2025, 1, 1, 8, 30, 15),
+    datetime.datetime(2025, 1, 1, 8, 30, 15, 123456),
+    datetime.datetime(2025, 1, 1, 8, 30, 15, tzinfo=datetime.timezone.utc),
+    datetime.datetime(2025, 1, 1, 8, 30, 15, 500000, tzinfo=TZ_8),
+    datetime.datetime(1969, 12, 31, 23, 59, 59, 999000),
+    datetime.datetime(1900, 6, 1, tzinfo=TZ_8),
+])
+def test_dumps_matches_json_util(value, monkeypatch):
+    document = {"_id": ObjectId("65a1b2c3d4e5f60718293a4b"), "value": value, "text": "北京暴雨"}
+    expected = json.loads(json_util.dumps(document))
+
+    assert json.loads(serialization.dumps(document)) == expected
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(serialization.dumps(document)) == expected
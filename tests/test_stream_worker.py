@@ -0,0 +1,109 @@
+import time
+import pytest
+from bson import Timestamp
+from stream_worker import StreamWorker
+
+
+@pytest.fixture
+def worker(processor, config):
+    return StreamWorker(processor, config)
+
+
+def insert_event(processor, label: int, title: str, vector: list, count: int = 3) -> None:
+    processor.collection.insert_many([
+        {
+            "text": title, "summary": title, "event_title": title,
+            "summary_embedding_cluster_label": label,
+            "summary_embedding_space": processor.embedding_provider.space,
+            "summary_embedding": vector,
+            "created_at": "2025-01-01T08:00:00"
+        }
+        for _ in range(count)
+    ])
+
+
+def insert_post(processor, vector: list):
+    return processor.collection.insert_one({
+        "text": "新帖子", "summary": "新帖子", "summary_embedding": vector, "created_at": "2025-01-01T09:00:00"
+    }).inserted_id
+
+
+def assign(worker, processor, post_id) -> set:
+    return worker.assign_to_events(list(processor.collection.find(
+        {"_id": post_id}, {"_id": 1, "summary_embedding": 1, "summary_embedding_cluster_label": 1}
+    )))
+
+
+def test_reloads_centroids_after_reclustering(worker, processor):
+    insert_event(processor, 1, "北京暴雨", [1.0, 0.0, 0.0])
+    insert_event(processor, 2, "上海台风", [0.0, 1.0, 0.0])
+    processor.mark_clusters_changed(in_progress=False)
+    worker.check_clusters()
+
+    # 全量聚类把两个事件的编号互换
+    processor.collection.update_many({"event_title": "北京暴雨"}, {"$set": {"summary_embedding_cluster_label": 2}})
+    processor.collection.update_many({"event_title": "上海台风"}, {"$set": {"summary_embedding_cluster_label": 1}})
+    processor.mark_clusters_changed(in_progress=False)
+
+    post_id = insert_post(processor, [1.0, 0.0, 0.0])
+    assert assign(worker, processor, post_id) == {post_id}
+    post = processor.collection.find_one({"_id": post_id})
+    assert post["summary_embedding_cluster_label"] == 2
+    assert post["event_title"] == "北京暴雨"
+
+
+def test_no_assignment_while_clustering_in_progress(worker, processor):
+    insert_event(processor, 1, "北京暴雨", [1.0, 0.0, 0.0])
+    processor.mark_clusters_changed(in_progress=False)
+    worker.check_clusters()
+    processor.mark_clusters_changed(in_progress=True)
+
+    post_id = insert_post(processor, [1.0, 0.0, 0.0])
+    assert assign(worker, processor, post_id) == set()
+    assert "summary_embedding_cluster_label" not in processor.collection.find_one({"_id": post_id})
+
+
+def test_replayed_batch_is_not_counted_twice(worker, processor):
+    insert_event(processor, 1, "北京暴雨", [1.0, 0.0, 0.0])
+    processor.mark_clusters_changed(in_progress=False)
+    post_id = processor.collection.insert_one({
+        "text": "北京暴雨", "summary": "北京暴雨", "summary_embedding": [1.0, 0.0, 0.0],
+        "summary_embedding_space": processor.embedding_provider.space,
+        "created_at": "2025-01-01T09:00:00", "attitudes_count": 2
+    }).inserted_id
+    changes = [{
+        "_id": {"_data": "token"},
+        "documentKey": {"_id": post_id},
+        "fullDocument": processor.collection.find_one({"_id": post_id}),
+        "clusterTime": Timestamp(int(time.time()), 1)
+    }]
+
+    # 保存 resume token 之前崩溃，重启后同一批次会再处理一次
+    worker.process(changes)
+    worker.process(changes)
+
+    rollup = processor.rollups.collection.find_one({"label": 1, "day": "2025-01-01"})
+    assert rollup["count"] == 1
+    assert rollup["attitudes"] == 2
+
+
+def test_titles_step_always_clears_in_progress(processor, monkeypatch):
+    # 后端在聚类和生成标题之间重启，没有 clusterer
+    processor.mark_clusters_changed(in_progress=True)
+    processor.generate_cluster_titles()
+    assert processor.cluster_state.find_one({"_id": "clusters"})["in_progress"] is False
+
+    processor.mark_clusters_changed(in_progress=True)
+    monkeypatch.setattr(processor, "_generate_cluster_titles", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        processor.generate_cluster_titles()
+    assert processor.cluster_state.find_one({"_id": "clusters"})["in_progress"] is False
+
+
+def test_stale_in_progress_flag_is_ignored(worker, processor):
+    insert_event(processor, 1, "北京暴雨", [1.0, 0.0, 0.0])
+    processor.mark_clusters_changed(in_progress=True)
+    worker.cluster_timeout = 0
+
+    post_id = insert_post(processor, [1.0, 0.0, 0.0])
+    assert assign(worker, processor, post_id) == {post_id}
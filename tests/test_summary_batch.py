@@ -0,0 +1,62 @@
+import json
+import re
+from info_processor import parse_summary_batch
+from fake_openai import INT_ID, INVALID, MISSING
+
+
+def test_parse_summary_batch_drops_missing_and_invalid_items():
+    content = json.dumps({"results": [
+        {"id": "1", "summary": "暴雨致道路积水", "response": 0, "org": ""},
+        {"id": 2, "summary": "政府发布通告", "response": "1", "org": "应急管理局"},
+        {"id": "3", "summary": "", "response": 0},
+        {"id": "4", "summary": "回应不合法", "response": 3},
+        {"id": "9", "summary": "未请求的编号", "response": 0},
+        "不是对象"
+    ]}, ensure_ascii=False)
+
+    parsed = parse_summary_batch(content, {"1", "2", "3", "4", "5"})
+
+    assert parsed == {
+        "1": ("暴雨致道路积水", 0, ""),
+        "2": ("政府发布通告", 1, "应急管理局"),
+    }
+
+
+def test_parse_summary_batch_rejects_non_json():
+    assert parse_summary_batch("摘要：暴雨", {"1"}) == {}
+    assert parse_summary_batch(json.dumps({"results": "x"}), {"1"}) == {}
+
+
+def test_summarize_documents_retries_missing_and_invalid(processor, fake_openai):
+    texts = ["北京暴雨", f"{MISSING}上海台风", f"{INVALID}广州高温", f"{INT_ID}政府回应积水", "深圳地铁故障"]
+    processor.collection.insert_many([{"text": text} for text in texts])
+
+    processor.summary_batch()
+
+    docs = {doc["text"]: doc for doc in processor.collection.find()}
+    assert all(doc.get("summary") == f"摘要{doc['text'][:10]}" for doc in docs.values())
+    assert docs[f"{INT_ID}政府回应积水"]["response"] == 1
+    assert docs[f"{INT_ID}政府回应积水"]["org"] == "应急管理局"
+    # 第一轮一个请求，第二轮只重新提交缺失和不合法的两篇
+    requests = fake_openai.chat_requests()
+    assert len(requests) == 2
+    assert re.findall(r"^\[(\d+)\]$", requests[1]["messages"][0]["content"], re.M) == ["1", "2"]
+
+
+def test_summarize_documents_resubmits_batch_after_write_failure(processor, fake_openai, monkeypatch):
+    processor.collection.insert_many([{"text": "北京暴雨"}, {"text": "上海台风"}])
+    bulk_write = processor.collection.bulk_write
+    calls = []
+
+    def flaky_bulk_write(operations, **kwargs):
+        calls.append(len(operations))
+        if len(calls) == 1:
+            raise RuntimeError("写入失败")
+        return bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(processor.collection, "bulk_write", flaky_bulk_write)
+
+    documents = list(processor.collection.find())
+    assert processor.summarize_documents(documents) == 2
+    assert calls == [2, 2]
+    assert processor.collection.count_documents({"summary": {"$exists": True}}) == 2